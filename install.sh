@@ -272,7 +272,7 @@ server {
     }
 
     # Public unprotected requests
-    location ~ ^/(ocsp|magic|certs|certify)/? {
+    location ~ ^/(ocsp|magic|certs|certify|enroll|status|stapling)/? {
         proxy_redirect off;
         proxy_set_header Host \$host;
         proxy_set_header Access-Control-Allow-Origin: \$http_origin;
@@ -26,6 +26,10 @@ def main(argv):
     VERBOSE       = True
     CA_HOST       = '127.0.0.1'
     CA_PORT       = 5000
+    CA_POOL       = 8
+    CA_MODE       = 'pool'
+    RENEW_LIMIT   = 4
+    RENEW_QUEUE   = 256
     WEB_HOST      = '127.0.0.1'
     WEB_PORT      = 8000
 
@@ -33,6 +37,11 @@ def main(argv):
     parser.add_argument("-d", "--dir", help="Define a default directory for files (default: {d})".format(d=BASE_DIR), default=BASE_DIR)
     parser.add_argument("-i", "--ip", help="Define CA server IP (default: {i})".format(i=CA_HOST), default=CA_HOST)
     parser.add_argument("-p", "--port", help="Define CA server port (default: {p})".format(p=CA_PORT), default=CA_PORT)
+    parser.add_argument("--ca-pool", help="Define max number of connections to CA server (default: {n})".format(n=CA_POOL), default=CA_POOL, type=int)
+    parser.add_argument("--ca-timeout", help="Override CA answer deadline for a task, can be repeated (ie: sign=60)", action='append', default=[], metavar='TASK=SECONDS')
+    parser.add_argument("--renew-limit", help="Define max number of renewals sent to CA at the same time (default: {n})".format(n=RENEW_LIMIT), default=RENEW_LIMIT, type=int)
+    parser.add_argument("--renew-queue", help="Define max number of renewals waiting, others are asked to retry later (default: {n})".format(n=RENEW_QUEUE), default=RENEW_QUEUE, type=int)
+    parser.add_argument("--ca-mode", help="Define CA client mode: 'pool' of REQ sockets or multiplexed 'dealer' socket (default: {m})".format(m=CA_MODE), default=CA_MODE, choices=['pool', 'dealer'])
 
     # Allow subparsers
     subparsers = parser.add_subparsers(title='commands')
@@ -44,13 +53,16 @@ def main(argv):
     parser_register.set_defaults(which='register')
     parser_register.add_argument("-s", "--seed", help="Allow RA registration against CA", required=True)
 
-    parser_crl = subparsers.add_parser('crl', help="Enable the 0MQ server in clear-mode. This allow to setup your RA certificates.")
+    parser_crl = subparsers.add_parser('crl', help="Generate a new CRL and update local crl.pem file. Not needed when RA is listening.")
     parser_crl.set_defaults(which='crl')
 
     parser_listen = subparsers.add_parser('listen', help="Enable the RA 0MQ server in TLS. This enable interactions by events emitted from RA.")
     parser_listen.set_defaults(which='listen')
     parser_listen.add_argument("-i", "--web-ip", help="Define web RA listening IP (default: {i})".format(i=WEB_HOST), default=WEB_HOST)
     parser_listen.add_argument("-p", "--web-port", help="Define web RA listening port (default: {p})".format(p=WEB_PORT), default=WEB_PORT)
+    parser_listen.add_argument("--ocsp-stapling", help="Pre-generate OCSP answers for all certificates, served in bulk on /stapling", action='store_true')
+    parser_listen.add_argument("--key-pool", help="Enable server-side enrollment on /enroll, keeping this number of keys pre-generated per profile key type (default: disabled)", default=0, type=int, metavar='SIZE')
+    parser_listen.add_argument("--crl-hook", help="Command to run each time CRL file is updated (ie: 'sudo service nginx reload')", default=None)
 
     args = parser.parse_args()
 
@@ -93,11 +105,27 @@ def main(argv):
         CA_HOST = args.ip
     if args.port:
         CA_PORT = args.port
+    if args.ca_pool:
+        CA_POOL = args.ca_pool
+    if args.ca_mode:
+        CA_MODE = args.ca_mode
+    if args.renew_limit:
+        RENEW_LIMIT = args.renew_limit
+    if args.renew_queue is not None:
+        RENEW_QUEUE = args.renew_queue
+
+    CA_TIMEOUTS = dict({})
+    for value in args.ca_timeout:
+        try:
+            (task, seconds) = value.split('=', 1)
+            CA_TIMEOUTS[task.strip()] = float(seconds)
+        except ValueError:
+            parser.error('Invalid CA timeout: {v}'.format(v=value))
 
     try:
         # Init PKI connection
         logger.debug('Start uPKI Registration Authority')
-        server_ra = RegistrationAuthority(logger, BASE_DIR, CA_HOST, CA_PORT)
+        server_ra = RegistrationAuthority(logger, BASE_DIR, CA_HOST, CA_PORT, pool_size=CA_POOL, ca_mode=CA_MODE, timeouts=CA_TIMEOUTS, renew_limit=RENEW_LIMIT, renew_queue=RENEW_QUEUE)
     except Exception as err:
         raise Exception('Unable to initialize RA: {e}'.format(e=err))
 
@@ -132,7 +160,7 @@ def main(argv):
     elif args.which == 'crl':
         try:
             # Generate CRL file
-            server_ra.generate_crl()
+            server_ra.refresh_crl()
         except Exception as err:
             raise Exception('Unable to generate CRL: {e}'.format(e=err))
 
@@ -157,6 +185,9 @@ def main(argv):
         with app.app_context():
             app.ra = server_ra
 
+        # Keep CRL (and OCSP answers) up to date in background
+        server_ra.start_services(crl_hook=args.crl_hook, stapling=args.ocsp_stapling, key_pool=args.key_pool)
+
         from server.routes.publicAPI import public_api
         from server.routes.clientAPI import client_api
         from server.routes.privateAPI import private_api
@@ -172,6 +203,8 @@ def main(argv):
             logger.critical('Bye!')
         except Exception as err:
             logger.critical('Unable to run WEB app: {e}'.format(e=err))
+        finally:
+            server_ra.close()
 
 # Gunicorn entry point generator
 def server(*args, **kwargs):
@@ -1,3 +1,4 @@
 from .core import *
 from .utils import *
-from .registrationAuthority import RegistrationAuthority
\ No newline at end of file
+from .connectors import *
+from .registrationAuthority import RegistrationAuthority
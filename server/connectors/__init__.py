@@ -0,0 +1,13 @@
+from .zmqPool import ZMQPool
+from .zmqDealer import ZMQDealer
+from .circuitBreaker import CircuitBreaker
+from .singleFlight import SingleFlight
+from .limiter import Limiter
+
+__all__ = (
+    'ZMQPool',
+    'ZMQDealer',
+    'CircuitBreaker',
+    'SingleFlight',
+    'Limiter',
+)
@@ -0,0 +1,66 @@
+# -*- coding:utf-8 -*-
+
+import time
+import threading
+
+class CircuitBreaker(object):
+    """Simple circuit breaker
+    After 'threshold' consecutive failures the circuit opens and calls are
+    refused for 'reset' seconds. Then a single trial call is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    """
+    CLOSED    = 'closed'
+    OPEN      = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, reset=30):
+        self.threshold = int(threshold)
+        self.reset     = reset
+        self._lock     = threading.Lock()
+        self._failures = 0
+        self._opened   = None
+        self._trial    = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened is None:
+            return self.CLOSED
+        if (time.time() - self._opened) >= self.reset:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Return True if a call can be made now
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                # Only one trial call at a time
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened   = None
+            self._trial    = False
+
+    def cancel(self):
+        """Call allowed but not made, give back trial slot
+        """
+        with self._lock:
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._failures >= self.threshold):
+                self._opened = time.time()
+            self._trial = False
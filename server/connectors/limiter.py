@@ -0,0 +1,49 @@
+# -*- coding:utf-8 -*-
+
+import threading
+
+class Limiter(object):
+    """Limit number of concurrent calls
+    Up to 'limit' callers run at the same time, up to 'queue' others wait
+    at most 'timeout' seconds for a free slot. Beyond that, callers are
+    refused immediately.
+    """
+    def __init__(self, limit, queue=0, timeout=None):
+        if int(limit) < 1:
+            raise ValueError('Limit must be positive')
+
+        self.limit    = int(limit)
+        self.queue    = int(queue)
+        self.timeout  = timeout
+        self._cond    = threading.Condition()
+        self._active  = 0
+        self._waiting = 0
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def acquire(self):
+        """Take a slot, return False if refused or on timeout
+        """
+        with self._cond:
+            if self._active < self.limit:
+                self._active += 1
+                return True
+            if self._waiting >= self.queue:
+                return False
+
+            self._waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self._active < self.limit, self.timeout):
+                    return False
+            finally:
+                self._waiting -= 1
+            self._active += 1
+
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+
+import threading
+
+class SingleFlight(object):
+    """Coalesce identical concurrent calls
+    First caller for a key runs the function, callers arriving while it is
+    in flight wait for it and get the same result (or exception).
+    Result is shared, not copied: callers must not modify it.
+    """
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._calls = dict({})
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func()
+        except Exception as err:
+            call['error'] = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+        return call['result']
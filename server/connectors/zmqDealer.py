@@ -0,0 +1,160 @@
+# -*- coding:utf-8 -*-
+
+import json
+import uuid
+import threading
+
+import zmq
+
+from ..utils import Common
+from ..core import CAConnectionError, CATimeoutError
+
+class ZMQDealer(Common):
+    """Multiplexed CA client using a single DEALER socket
+    Each request is prefixed by a correlation ID frame, the CA REP socket
+    keeps it as routing envelope and sends it back with the answer.
+    Any number of threads can then wait for their answer concurrently.
+
+    The DEALER socket is only used by the I/O thread, callers hand their
+    requests over an inproc PUSH/PULL pair.
+    """
+    def __init__(self, logger, url):
+        try:
+            super(ZMQDealer, self).__init__(logger)
+        except Exception as err:
+            raise Exception(err)
+
+        self._url      = url
+        self._inproc   = 'inproc://ca-dealer-{i}'.format(i=uuid.uuid4().hex)
+        self._context  = zmq.Context()
+        self._pending  = dict({})
+        self._lock     = threading.Lock()
+        self._closed   = False
+
+        self.output("Connect socket use ZMQ version {v}".format(v=zmq.zmq_version()), level="DEBUG")
+
+        try:
+            # Bind receiving side before anyone can push
+            self._pull = self._context.socket(zmq.PULL)
+            self._pull.bind(self._inproc)
+            self._push = self._context.socket(zmq.PUSH)
+            self._push.setsockopt(zmq.LINGER, 0)
+            self._push.connect(self._inproc)
+            self._dealer = self._context.socket(zmq.DEALER)
+            self._dealer.setsockopt(zmq.LINGER, 0)
+            self._dealer.connect(self._url)
+        except zmq.ZMQError as err:
+            raise CAConnectionError("Stalker process failed with: {e}".format(e=err))
+
+        self.output("Socket connected to {host}".format(host=self._url), level="DEBUG")
+
+        self._thread = threading.Thread(target=self._loop, name='ca-dealer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _loop(self):
+        """Forward outgoing requests and dispatch answers to waiting callers
+        """
+        poller = zmq.Poller()
+        poller.register(self._pull, zmq.POLLIN)
+        poller.register(self._dealer, zmq.POLLIN)
+
+        while not self._closed:
+            try:
+                events = dict(poller.poll(500))
+            except zmq.ZMQError as err:
+                if self._closed:
+                    break
+                self.output('Dealer poll failed: {e}'.format(e=err), level="ERROR")
+                continue
+
+            try:
+                if events.get(self._pull) == zmq.POLLIN:
+                    while True:
+                        try:
+                            frames = self._pull.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._dealer.send_multipart(frames)
+
+                if events.get(self._dealer) == zmq.POLLIN:
+                    while True:
+                        try:
+                            frames = self._dealer.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        self._dispatch(frames)
+            except zmq.ZMQError as err:
+                if self._closed:
+                    break
+                self.output('Dealer I/O failed: {e}'.format(e=err), level="ERROR")
+
+        for sock in (self._pull, self._dealer):
+            sock.close(linger=0)
+
+    def _dispatch(self, frames):
+        # Expected answer: [request id, '', json body]
+        if len(frames) != 3 or len(frames[1]):
+            self.output('Dropping malformed CA answer', level="WARNING")
+            return
+
+        with self._lock:
+            waiter = self._pending.pop(frames[0], None)
+
+        if waiter is None:
+            # Caller gave up waiting
+            self.output('Dropping late CA answer', level="DEBUG")
+            return
+
+        try:
+            waiter['answer'] = json.loads(frames[2].decode('utf-8'))
+        except ValueError:
+            waiter['error'] = Exception('Received unparsable message')
+
+        waiter['event'].set()
+
+    def send(self, message, timeout=None):
+        """Send a message to CA and wait for its answer
+        """
+        if self._closed:
+            raise CAConnectionError('CA connection is closed')
+
+        req_id = uuid.uuid4().bytes
+        waiter = {'event': threading.Event(), 'answer': None, 'error': None}
+
+        with self._lock:
+            self._pending[req_id] = waiter
+            try:
+                # PUSH socket is shared, lock also serialize its use
+                self._push.send_multipart([req_id, b'', json.dumps(message).encode('utf-8')])
+            except zmq.ZMQError as err:
+                del self._pending[req_id]
+                raise CAConnectionError('ZMQ Error: {e}'.format(e=err))
+
+        if not waiter['event'].wait(timeout):
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise CATimeoutError('CA did not answer in {t}s'.format(t=timeout))
+
+        if waiter['error'] is not None:
+            raise waiter['error']
+
+        return waiter['answer']
+
+    def close(self):
+        """Stop I/O thread, fail pending requests and terminate context
+        """
+        self._closed = True
+        self._thread.join(2)
+
+        with self._lock:
+            self._push.close(linger=0)
+            for waiter in self._pending.values():
+                waiter['error'] = CAConnectionError('CA connection is closed')
+                waiter['event'].set()
+            self._pending.clear()
+
+        try:
+            self._context.destroy(linger=0)
+        except Exception as err:
+            self.output('Unable to terminate ZMQ context: {e}'.format(e=err), level="WARNING")
@@ -0,0 +1,164 @@
+# -*- coding:utf-8 -*-
+
+import time
+import queue
+import threading
+
+import zmq
+
+from ..utils import Common
+from ..core import CAConnectionError, CATimeoutError, CAPoolExhaustedError
+
+# Seconds clients should wait when no connection is available
+POOL_RETRY_AFTER = 5
+
+class ZMQPool(Common):
+    """Thread-safe pool of REQ sockets connected to the CA
+    All sockets share the same ZMQ context, each socket is checked out by
+    a single thread for a complete request/reply cycle and then given back.
+    Sockets that failed (or are too old) are closed and replaced.
+    """
+    def __init__(self, logger, url, size=8, max_age=3600):
+        try:
+            super(ZMQPool, self).__init__(logger)
+        except Exception as err:
+            raise Exception(err)
+
+        if int(size) < 1:
+            raise ValueError('Pool size must be positive')
+
+        self._url     = url
+        self._size    = int(size)
+        self._max_age = max_age
+        self._context = zmq.Context()
+        self._idle    = queue.LifoQueue()
+        self._lock    = threading.Lock()
+        self._created = 0
+        self._closed  = False
+
+        self.output("Connect sockets use ZMQ version {v}".format(v=zmq.zmq_version()), level="DEBUG")
+
+    def _connect(self):
+        """Create a new REQ socket connected to CA
+        """
+        sock = self._context.socket(zmq.REQ)
+        # Never block on close with pending messages
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(self._url)
+        self.output("Socket connected to {host}".format(host=self._url), level="DEBUG")
+
+        return (sock, time.time())
+
+    def _discard(self, item):
+        """Close a socket and free its slot in pool
+        """
+        try:
+            item[0].close(linger=0)
+        except Exception as err:
+            self.output('Unable to close socket: {e}'.format(e=err), level="WARNING")
+
+        with self._lock:
+            self._created -= 1
+
+    def _healthy(self, item):
+        (sock, created) = item
+        if sock.closed:
+            return False
+        if self._max_age and (time.time() - created) > self._max_age:
+            return False
+        return True
+
+    def _checkout(self, timeout=None):
+        """Get an idle socket, create one if pool is not full
+        or wait for another thread to give one back
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            if self._closed:
+                raise CAConnectionError('Connection pool is closed')
+
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                item = None
+
+            if item is None:
+                with self._lock:
+                    create = self._created < self._size
+                    if create:
+                        self._created += 1
+                if create:
+                    try:
+                        return self._connect()
+                    except zmq.ZMQError as err:
+                        with self._lock:
+                            self._created -= 1
+                        raise CAConnectionError("Stalker process failed with: {e}".format(e=err))
+                try:
+                    wait = None if deadline is None else max(0, deadline - time.time())
+                    item = self._idle.get(timeout=wait)
+                except queue.Empty:
+                    raise CAPoolExhaustedError('No CA connection available', retry_after=POOL_RETRY_AFTER)
+
+            if self._healthy(item):
+                return item
+
+            # Recycle socket
+            self._discard(item)
+
+    def _checkin(self, item):
+        if self._closed:
+            self._discard(item)
+        else:
+            self._idle.put(item)
+
+    def send(self, message, timeout=None):
+        """Send a message to CA and wait for its answer
+        Timeout (in seconds) apply to each step: socket checkout and CA answer.
+        The socket used is recycled on any transport error.
+        """
+        item = self._checkout(timeout)
+        sock = item[0]
+
+        try:
+            sock.send_json(message)
+            if timeout is not None:
+                if not sock.poll(int(timeout * 1000), zmq.POLLIN):
+                    # REQ socket is stuck waiting for this answer
+                    self._discard(item)
+                    raise CATimeoutError('CA did not answer in {t}s'.format(t=timeout))
+            answer = sock.recv_json()
+        except CATimeoutError:
+            raise
+        except zmq.ZMQError as err:
+            self._discard(item)
+            raise CAConnectionError('ZMQ Error: {e}'.format(e=err))
+        except ValueError:
+            # Answer has been consumed, socket can still be used
+            self._checkin(item)
+            raise Exception('Received unparsable message')
+        except BaseException:
+            self._discard(item)
+            raise
+
+        self._checkin(item)
+
+        return answer
+
+    def close(self):
+        """Close all sockets and terminate context
+        """
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(item)
+
+        try:
+            # Also close sockets still checked out
+            self._context.destroy(linger=0)
+        except Exception as err:
+            self.output('Unable to terminate ZMQ context: {e}'.format(e=err), level="WARNING")
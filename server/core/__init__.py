@@ -1,7 +1,12 @@
-from .upkiError import UPKIError
+from .upkiError import UPKIError, CAConnectionError, CATimeoutError, CAUnavailableError, RAOverloadedError, CAPoolExhaustedError
 from .phkLogger import PHKLogger
 
 __all__ = (
     'UPKIError',
+    'CAConnectionError',
+    'CATimeoutError',
+    'CAUnavailableError',
+    'RAOverloadedError',
+    'CAPoolExhaustedError',
     'PHKLogger'
-)
\ No newline at end of file
+)
@@ -14,3 +14,33 @@ class UPKIError(Exception):
         
     def __str__(self):
         return repr("Error [{code}]: {reason}".format(code= self.code, reason= self.reason))
+
+class CAConnectionError(Exception):
+    """Transport error between RA and CA
+    Raised when the CA can not be reached, never for errors sent back by CA
+    """
+    pass
+
+class CATimeoutError(CAConnectionError):
+    """CA did not answer in time
+    """
+    pass
+
+class CAUnavailableError(CAConnectionError):
+    """CA is considered down, request has not been sent
+    """
+    pass
+
+class RAOverloadedError(Exception):
+    """Too many requests are waiting for CA, client should come back
+    after 'retry_after' seconds
+    """
+    def __init__(self, message, retry_after=60):
+        super(RAOverloadedError, self).__init__(message)
+        self.retry_after = int(retry_after)
+
+class CAPoolExhaustedError(RAOverloadedError):
+    """All CA connections stayed busy, request has not been sent
+    Says nothing about CA health
+    """
+    pass
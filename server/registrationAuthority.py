@@ -2,15 +2,101 @@
 
 import os
 import grp
-import zmq
 import json
+import base64
+import time
+import random
 import hashlib
+import datetime
+import itertools
+import threading
 import subprocess
+import concurrent.futures
 
 import server
 
+# CA answer deadlines (in seconds) per task
+TASK_TIMEOUTS = {
+    'get_ca': 5,
+    'get_crl': 5,
+    'check_ocsp': 5,
+    'get_options': 5,
+    'get_node': 5,
+    'download_node': 5,
+    'list_profiles': 10,
+    'list_admins': 10,
+    'list_nodes': 30,
+    'sign': 30,
+    'renew': 30,
+    'generate_crl': 60,
+}
+DEFAULT_TIMEOUT = 15
+
+# Read-only tasks, safe to send again on connection failure
+IDEMPOTENT_TASKS = ('get_ca', 'get_crl', 'check_ocsp', 'get_options', 'get_node', 'download_node', 'list_profiles', 'list_admins', 'list_nodes')
+
+# Max delay (in seconds) between two background CRL generations
+CRL_INTERVAL = 86400
+
+# OCSP answers cache: max entries and lifetime when nextUpdate is not set
+OCSP_CACHE_SIZE  = 10000
+OCSP_DEFAULT_TTL = 300
+
+# Issued certificates cache max entries
+CERT_CACHE_SIZE = 10000
+
+# Max age (in seconds) of local profiles before reloading them from CA
+PROFILES_TTL = 300
+
+# Max age (in seconds) of CA options before reloading them
+OPTIONS_TTL = 300
+
+# Nodes infos (DN, SANs) used to build requests, by profile and CN
+NODE_CACHE_SIZE = 10000
+NODE_CACHE_TTL  = 300
+
+# Nodes listing: page size when paginating and allowed sort fields
+NODES_PAGE     = 100
+NODES_MAX_PAGE = 1000
+NODES_SORT     = ('dn', 'cn', 'profile', 'state', 'expire', 'serial')
+
+# Nodes replica: max age (in seconds) before a full sync with CA on read,
+# and background sync interval in listen mode
+NODES_SYNC_TTL      = 300
+NODES_SYNC_INTERVAL = 60
+
+# Max delay (in seconds) between two OCSP answers pre-generation runs
+OCSP_PREGEN_INTERVAL = 3600
+
+# Max CA signature calls in flight for bulk signing
+SIGN_WINDOW = 16
+
+# Renewals: max CA calls at the same time, max renewals waiting (at most
+# RENEW_WAIT seconds) for a slot, base delay before clients try again when
+# refused, and how long a renewed certificate is sent back to retries
+RENEW_LIMIT       = 4
+RENEW_QUEUE       = 256
+RENEW_WAIT        = 30
+RENEW_RETRY_AFTER = 30
+RENEW_CACHE_TTL   = 300
+
+# Pre-generated keys for server-side enrollment: delay (in seconds)
+# between two pools checks and processes used to generate keys
+KEY_POOL_INTERVAL = 600
+KEY_POOL_WORKERS  = 2
+
+# Background jobs workers (listen mode)
+JOBS_WORKERS = 4
+
+# Min delay (in seconds) between two nodes list retrievals for unknown serials
+SERIALS_REFRESH = 30
+
+# Tasks whose last answer is served if CA is unavailable
+# (nodes list is not part of it, local replica already plays this role)
+FALLBACK_TASKS = ('get_ca', 'get_crl', 'get_options', 'list_profiles', 'list_admins')
+
 class RegistrationAuthority(server.utils.Tools):
-    def __init__(self, logger, path, host, port):
+    def __init__(self, logger, path, host, port, pool_size=8, ca_mode='pool', timeouts=None, retries=2, renew_limit=RENEW_LIMIT, renew_queue=RENEW_QUEUE):
         try:
             super(RegistrationAuthority, self).__init__(logger)
         except Exception as err:
@@ -23,8 +109,67 @@ class RegistrationAuthority(server.utils.Tools):
 
         self._path    = path
         self._ca_url  = remote
-        self.nodes    = dict({})
-        self.profiles = dict({})
+        self.nodes    = server.utils.NodeStore(parse_serial=self._parse_serial, parse_date=self._parse_date)
+        self.profiles = server.utils.ProfileStore(ttl=PROFILES_TTL)
+        self._options = None
+
+        # CA calls behaviour
+        self._timeouts  = dict(TASK_TIMEOUTS)
+        self._timeouts.update(timeouts or {})
+        self._retries   = int(retries)
+        self._breaker   = server.connectors.CircuitBreaker()
+        self._flights   = server.connectors.SingleFlight()
+        self._fallbacks = dict({})
+
+        # Local copies of CA certificate and CRL served to clients
+        self.ca_file      = server.utils.CachedFile(os.path.join(self._path, 'ca.crt'))
+        self.crl_file     = server.utils.CachedFile(os.path.join(self._path, 'crl.pem'), expiry=self._crl_next_update)
+        self._crl_lock    = threading.Lock()
+        self._crl_checked = None
+        self._crl_hook    = None
+
+        # Signed OCSP answers by CertID
+        self.ocsp_cache = server.utils.LRUCache(OCSP_CACHE_SIZE, ttl=OCSP_DEFAULT_TTL)
+
+        # Issued certificates by DN, and DN by serial
+        self.certs = server.utils.LRUCache(CERT_CACHE_SIZE)
+
+        # Nodes request infos by (profile, cn) and openssl commands templates by profile
+        self.node_requests = server.utils.LRUCache(NODE_CACHE_SIZE, ttl=NODE_CACHE_TTL)
+        self._templates    = dict({})
+
+        # Pre-generated OCSP answers for stapling, only set in listen mode
+        self.ocsp_store = None
+
+        # Background jobs, only set in listen mode
+        self.jobs = None
+
+        # Pre-generated keys, only set in listen mode if enabled
+        self.key_pool = None
+
+        # Renewals in flight by DN, CA calls limit and recent renewals by DN
+        self._renewals      = server.connectors.SingleFlight()
+        self._renew_limiter = server.connectors.Limiter(renew_limit, queue=renew_queue, timeout=RENEW_WAIT)
+        self._renewed       = server.utils.LRUCache(CERT_CACHE_SIZE, ttl=RENEW_CACHE_TTL)
+
+        # Local revocation status from CRL, issued serials come from nodes
+        self.revocations      = server.utils.RevocationIndex()
+        self._serials_checked = 0
+        self._nodes_lock      = threading.Lock()
+
+        # Background tasks, only run in listen mode
+        self.scheduler = server.utils.Scheduler(logger)
+
+        try:
+            # Long-lived connections to CA shared by all requests
+            if ca_mode == 'pool':
+                self._connector = server.connectors.ZMQPool(logger, self._ca_url, size=pool_size)
+            elif ca_mode == 'dealer':
+                self._connector = server.connectors.ZMQDealer(logger, self._ca_url)
+            else:
+                raise Exception('Unknown CA mode: {m}'.format(m=ca_mode))
+        except Exception as err:
+            raise Exception('Unable to setup CA connections: {e}'.format(e=err))
         
         try:
             # First get CA certificate
@@ -45,6 +190,7 @@ class RegistrationAuthority(server.utils.Tools):
                 with open(ca_path, 'wt') as raw:
                     raw.write(ca_pem)
                 self.output('CA certificate stored in {p}'.format(p=ca_path))
+            self.ca_file.load()
         except Exception as err:
             raise Exception('Unable to retrieve CA certificate: {e}'.format(e=err))
 
@@ -52,14 +198,13 @@ class RegistrationAuthority(server.utils.Tools):
             # Then generate and retrieve CRL
             crl_done = self._send('generate_crl')
             crl_pem  = self.get_crl()
-            with open(os.path.join(self._path, 'crl.pem'), 'wt') as raw:
-                raw.write(crl_pem)
+            self._store_crl(crl_pem)
         except Exception as err:
             raise Exception('Unable to retrieve CRL: {e}'.format(e=err))
 
         try:
             # Finally store all profiles
-            self.list_profiles()
+            self.refresh_profiles()
         except Exception as err:
             raise Exception('Unable to list profiles: {e}'.format(e=err))
 
@@ -75,39 +220,42 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception('Error on registration process: {e}'.format(e=err))
 
-        for (profile, name) in [('user','ra'), ('server','certificates'), ('admin','admin')]:
-            try:
-                cn = self._get_cn(generated_dn[name])
-            except Exception as err:
-                raise Exception('Unable to extract CN: {e}'.format(e=err))
-            try:
-                # Build openssl command
-                cmd = self.generate_command(profile, {'cn': cn}, filename=name)
-            except Exception as err:
-                raise Exception('Error on generation process: {e}'.format(e=err))
-
-            try:
-                # Execute command generated
-                self.output('Command generated:\n{c}'.format(c=cmd), level="INFO")
-                p = subprocess.Popen(cmd, cwd=self._path, shell=True, stdout=subprocess.PIPE, executable='/bin/bash')
-                p.wait()
-            except Exception as err:
-                raise Exception('Unable to generate RA keychain: {e}'.format(e=err))
-
-            # All done for certificate requests and private key
-            self.output('{n} Private key and Certificate Request saved in {p}{n}.key and {p}{n}.csr'.format(n=name, p=self._path))
-            with open(os.path.join(self._path, '{n}.csr'.format(n=name)), 'rt') as raw:
-                csr = raw.read()
-
+        keychains = [('user','ra'), ('server','certificates'), ('admin','admin')]
+        generated = dict({})
+        # Key generation is CPU bound, generate all keychains in parallel
+        with concurrent.futures.ProcessPoolExecutor(max_workers=len(keychains)) as workers:
+            for (profile, name) in keychains:
+                try:
+                    cn = self._get_cn(generated_dn[name])
+                except Exception as err:
+                    raise Exception('Unable to extract CN: {e}'.format(e=err))
+                try:
+                    params = self._keychain_params(profile, cn)
+                except Exception as err:
+                    raise Exception('Error on generation process: {e}'.format(e=err))
+                generated[name] = workers.submit(server.utils.generate_keychain, **params)
+
+            for (profile, name) in keychains:
+                try:
+                    (key_pem, csr_pem) = generated[name].result()
+                    server.utils.write_file(os.path.join(self._path, '{n}.key'.format(n=name)), key_pem, mode=0o600)
+                    server.utils.write_file(os.path.join(self._path, '{n}.csr'.format(n=name)), csr_pem)
+                except Exception as err:
+                    raise Exception('Unable to generate RA keychain: {e}'.format(e=err))
+                generated[name] = csr_pem.decode('utf-8')
+
+                # All done for certificate requests and private key
+                self.output('{n} Private key and Certificate Request saved in {p}{n}.key and {p}{n}.csr'.format(n=name, p=self._path))
+
+        for (profile, name) in keychains:
             try:
                 # Sign Certificate Request
-                data = self.sign_node({'CSR': csr})
+                data = self.sign_node({'CSR': generated[name]})
             except Exception as err:
                 raise Exception('Error on signing process: {e}'.format(e=err))
 
             # Write certificate received
-            with open(os.path.join(self._path, '{n}.crt'.format(n=name)), 'wt') as raw:
-                raw.write(data['certificate'])
+            server.utils.write_file(os.path.join(self._path, '{n}.crt'.format(n=name)), data['certificate'].encode('utf-8'))
 
             self.output('{n} Certificate saved in {p}{n}.crt'.format(n=name, p=self._path))
 
@@ -119,12 +267,43 @@ class RegistrationAuthority(server.utils.Tools):
         return True
 
     def get_options(self):
+        return self.cached_options()['options']
+
+    def cached_options(self):
+        """Return CA options entry ('options', 'etag'), reloaded from CA
+        when older than OPTIONS_TTL
+        """
+        entry = self._options
+        if (entry is None) or (time.time() - entry['loaded'] >= OPTIONS_TTL):
+            try:
+                entry = self.refresh_options()
+            except Exception as err:
+                if entry is None:
+                    raise Exception(err)
+                # Serve known options, try again later
+                self.output('Unable to refresh options: {e}'.format(e=err), level="WARNING")
+                entry = dict(entry, loaded=time.time())
+                self._options = entry
+
+        return entry
+
+    def refresh_options(self):
+        """Reload options from CA
+        """
         try:
             data = self._send('get_options')
         except Exception as err:
             raise Exception(err)
 
-        return data
+        etag = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        self._options = {'options': data, 'etag': etag, 'loaded': time.time()}
+
+        return self._options
+
+    def _options_task(self):
+        """Keep options fresh in background
+        """
+        self.refresh_options()
 
     def generate_crl(self):
         try:
@@ -135,12 +314,170 @@ class RegistrationAuthority(server.utils.Tools):
         return data
 
     def check_ocsp(self, data):
+        """Return CA signed OCSP answer, served from cache while valid
+        Request is identified by its CertID from 'request' (base64 DER OCSP
+        request) or 'cert' (PEM certificate) value.
+        """
+        return self.ocsp_answer(data)['result']
+
+    def ocsp_answer(self, data, cached=True):
+        """Same as check_ocsp but also return DER answer and its infos
+        (status and validity dates) ready to be sent over HTTP
+        Set 'cached' to False to force a new answer from CA
+        """
+        try:
+            cert_id = self._ocsp_lookup_id(data)
+        except Exception as err:
+            if isinstance(data, dict) and ('request' in data):
+                raise ValueError(err)
+            # Unable to identify certificate, let CA decide
+            self.output('OCSP request not cacheable: {e}'.format(e=err), level="DEBUG")
+            cert_id = None
+
+        if cached and (cert_id is not None):
+            entry = self.ocsp_cache.get(cert_id)
+            if (entry is not None) and self._ocsp_consistent(cert_id[3], entry):
+                return entry
+
         try:
             result = self._send('check_ocsp', params=data)
         except Exception as err:
             raise Exception(err)
 
-        return data
+        try:
+            der = base64.b64decode(result['response'])
+        except Exception as err:
+            raise Exception('Invalid OCSP answer: {e}'.format(e=err))
+
+        try:
+            infos = self._ocsp_response_infos(der)
+        except Exception as err:
+            self.output('Unable to parse OCSP answer: {e}'.format(e=err), level="WARNING")
+            infos = {'successful': False}
+
+        entry = {'result': result, 'der': der, 'infos': infos}
+        if cert_id is not None:
+            self._cache_ocsp(cert_id, entry)
+
+        return entry
+
+    def pregenerate_ocsp(self):
+        """Make sure each active certificate has a valid OCSP answer in store
+        Answers are regenerated once half of their validity has passed.
+        Return delay (in seconds) before next answer needs regeneration.
+        """
+        active = dict({})
+        for node in self.list_nodes():
+            try:
+                serial = self._parse_serial(node['Serial'])
+            except Exception:
+                continue
+            if str(node.get('State', '')).lower() == 'expired':
+                continue
+            active[serial] = node
+
+        # Forget certificates no longer active
+        for serial in self.ocsp_store.serials() - set(active.keys()):
+            self.ocsp_store.remove(serial)
+
+        now     = datetime.datetime.utcnow()
+        delay   = OCSP_PREGEN_INTERVAL
+        renewed = 0
+        for serial, node in active.items():
+            renew_at = self._ocsp_renew_at(self.ocsp_store.meta(serial))
+            if (renew_at is not None) and (renew_at > now):
+                delay = min(delay, (renew_at - now).total_seconds())
+                continue
+
+            try:
+                request_der = self.ocsp_store.request(serial)
+                if request_der is None:
+                    cert_pem = self.download_node({'dn': node['DN']})
+                    request_der = self._ocsp_request(cert_pem, self.cached_ca()['content'])
+                answer = self.ocsp_answer({'request': base64.b64encode(request_der).decode('utf-8')}, cached=False)
+                if not answer['infos']['successful']:
+                    raise Exception('unsuccessful answer')
+                self.ocsp_store.put(serial, request_der, answer['der'], answer['infos']['this_update'], answer['infos']['next_update'])
+            except Exception as err:
+                self.output('Unable to pre-generate OCSP answer for {s:X}: {e}'.format(s=serial, e=err), level="WARNING")
+                delay = min(delay, 60)
+                continue
+
+            renewed += 1
+            renew_at = self._ocsp_renew_at(self.ocsp_store.meta(serial))
+            delay = min(delay, (renew_at - now).total_seconds())
+
+        if renewed:
+            self.output('{n} OCSP answers pre-generated'.format(n=renewed))
+
+        return max(60, delay)
+
+    def _ocsp_renew_at(self, meta):
+        """When a stored OCSP answer must be regenerated
+        """
+        if meta is None:
+            return None
+        if meta['next_update'] is None:
+            return meta['this_update'] + datetime.timedelta(seconds=OCSP_PREGEN_INTERVAL)
+        return meta['this_update'] + (meta['next_update'] - meta['this_update']) / 2
+
+    def _forget_ocsp(self, dn):
+        """Drop cached OCSP answers of a node
+        """
+        node = self.nodes.get(dn)
+        try:
+            serial = self._parse_serial(node['Serial'])
+        except Exception:
+            # Serial is unknown, drop everything
+            self.ocsp_cache.clear()
+            return
+
+        # CertID last item is serial
+        self.ocsp_cache.discard(lambda k: k[3] == serial)
+
+    def _ocsp_consistent(self, serial, entry):
+        """Check cached answer against local revocation index
+        """
+        local = self.local_status(serial)
+        if (local is None) or (local['state'] == entry['infos']['status']):
+            return True
+
+        self.output('Cached OCSP answer for {s:x} is outdated'.format(s=serial), level="DEBUG")
+        return False
+
+    def _ocsp_lookup_id(self, data):
+        """CertID used as OCSP cache key, None if answer can not be shared
+        """
+        try:
+            request_der = base64.b64decode(data['request'])
+        except KeyError:
+            request_der = self._ocsp_request(data['cert'], self.cached_ca()['content'])
+
+        cert_id = self._ocsp_cert_id(request_der)
+        # Answer must echo client nonce
+        if self._ocsp_nonce(request_der) is not None:
+            return None
+
+        return cert_id
+
+    def _cache_ocsp(self, cert_id, entry):
+        """Keep OCSP answer until its nextUpdate
+        """
+        infos = entry['infos']
+
+        # Never cache errors (ie: tryLater)
+        if not infos['successful']:
+            return False
+
+        if infos['next_update'] is None:
+            self.ocsp_cache.set(cert_id, entry)
+        else:
+            expires = infos['next_update'].replace(tzinfo=datetime.timezone.utc).timestamp()
+            if expires <= time.time():
+                return False
+            self.ocsp_cache.set(cert_id, entry, expires=expires)
+
+        return True
 
     def get_ca(self):
         try:
@@ -158,48 +495,251 @@ class RegistrationAuthority(server.utils.Tools):
 
         return data
 
+    def refresh_crl(self):
+        """Generate a new CRL on CA and atomically replace local copy
+        """
+        with self._crl_lock:
+            self.generate_crl()
+            changed = self._store_crl(self.get_crl())
+            self._crl_checked = datetime.datetime.utcnow()
+
+        if changed:
+            self.output('CRL updated in {p}'.format(p=self.crl_file.path))
+            if self._crl_hook:
+                try:
+                    subprocess.check_call(self._crl_hook, cwd=self._path, shell=True)
+                except Exception as err:
+                    self.output('CRL hook failed: {e}'.format(e=err), level="ERROR")
+
+        return changed
+
+    def _store_crl(self, crl_pem):
+        """Replace local CRL and update revocation index
+        """
+        changed = self.crl_file.store(crl_pem)
+        if changed or (self.revocations.last_update is None):
+            try:
+                serials = self.revocations.update(crl_pem)
+            except Exception as err:
+                self.output('Unable to index CRL: {e}'.format(e=err), level="WARNING")
+                serials = set()
+            if serials:
+                for serial in serials:
+                    self._uncache_cert(serial=serial)
+                # CertID last item is serial
+                self.ocsp_cache.discard(lambda k: k[3] in serials)
+                if self.ocsp_store is not None:
+                    for serial in serials:
+                        self.ocsp_store.remove(serial)
+                    self.scheduler.trigger('ocsp')
+
+        return changed
+
+    def local_status(self, serial):
+        """Revocation status known locally, without asking CA
+        Return None if serial is unknown (or local CRL has expired)
+        """
+        serial = self._parse_serial(serial)
+
+        if not self.revocations.fresh():
+            return None
+
+        revoked = self.revocations.lookup(serial)
+        if revoked is not None:
+            return {'serial': serial, 'state': 'revoked', 'reason': revoked['reason'], 'revocation_date': revoked['date']}
+
+        node = self.nodes.by_serial(serial)
+        if node is None:
+            return None
+        # Revoked since last CRL, only CA knows revocation details
+        if str(node.get('State', '')).lower() == 'revoked':
+            return None
+
+        return {'serial': serial, 'state': 'good'}
+
+    def serial_status(self, serial):
+        """Revocation status, refresh issued serials from CA if unknown
+        """
+        status = self.local_status(serial)
+        if status is not None:
+            return status
+
+        # Revoked by RA but not yet in CRL: details come with next CRL
+        node = self.nodes.by_serial(self._parse_serial(serial))
+        if (node is not None) and (str(node.get('State', '')).lower() == 'revoked'):
+            self.scheduler.trigger('crl')
+            return {'serial': self._parse_serial(serial), 'state': 'revoked', 'reason': 'unspecified', 'revocation_date': None}
+
+        # Do not let unknown serials hammer CA
+        if (time.time() - self._serials_checked) >= SERIALS_REFRESH:
+            self._serials_checked = time.time()
+            self.list_nodes(refresh=True)
+            status = self.local_status(serial)
+
+        if status is None:
+            status = {'serial': self._parse_serial(serial), 'state': 'unknown'}
+
+        return status
+
+    def cached_ca(self):
+        """CA certificate served from local copy
+        """
+        return self.ca_file.get()
+
+    def cached_crl(self):
+        """CRL served from local copy, retrieved again from CA once expired
+        """
+        if self.crl_file.stale():
+            with self._crl_lock:
+                now = datetime.datetime.utcnow()
+                # Do not hammer CA if it did not publish a new CRL yet
+                recent = self._crl_checked and ((now - self._crl_checked).total_seconds() < 60)
+                if self.crl_file.stale() and not recent:
+                    self._crl_checked = now
+                    try:
+                        self._store_crl(self.get_crl())
+                    except Exception as err:
+                        self.output('Unable to refresh CRL: {e}'.format(e=err), level="WARNING")
+
+        return self.crl_file.get()
+
     def download_node(self, data):
         try:
             data['dn']
         except KeyError:
             raise Exception('Missing DN value')
         
+        return self.cached_node(data['dn'])['certificate']
+
+    def cached_node(self, dn):
+        """Return issued certificate entry (certificate, serial, etag)
+        served from cache, a certificate never changes once issued
+        """
+        entry = self.certs.get(('dn', dn))
+        if entry is not None:
+            return entry
+
         try:
-            result = self._send('download_node', params=data['dn'])
+            result = self._send('download_node', params=dn)
         except Exception as err:
             raise Exception(err)
 
-        return result
+        return self._cache_cert(dn, result)
 
-    def generate_command(self, profile, data, filename=None):
+    def _cache_cert(self, dn, cert_pem):
+        entry = {
+            'dn': dn,
+            'certificate': cert_pem,
+            'etag': hashlib.sha256(cert_pem.encode('utf-8')).hexdigest(),
+            'serial': None,
+            'not_after': None,
+        }
         try:
-            cn = data['cn']
-        except KeyError:
-            raise Exception('Missing CN value')
-        
+            entry.update(self._cert_infos(cert_pem))
+        except Exception as err:
+            # Still cache it, only validity is unknown
+            self.output('Unable to read certificate of {d}: {e}'.format(d=dn, e=err), level="WARNING")
+
+        self.certs.set(('dn', dn), entry)
+        if entry['serial'] is not None:
+            self.certs.set(('serial', entry['serial']), dn)
+
+        return entry
+
+    def _uncache_cert(self, dn=None, serial=None):
+        """Drop certificate from cache by DN or serial
+        """
+        if (dn is None) and (serial is not None):
+            dn = self.certs.pop(('serial', serial))
+        if dn is None:
+            return
+        entry = self.certs.pop(('dn', dn))
+        if (entry is not None) and (entry['serial'] is not None):
+            self.certs.pop(('serial', entry['serial']))
+
+    def _node_request(self, profile, cn):
+        """Return profile and node infos needed to build a request
+        Node infos are cached, with the openssl SAN option they give
+        """
         try:
             # Get profile infos
             profile_data = self.profiles[profile]
         except KeyError:
             raise Exception('Invalid profile type')
 
+        node_data = self.node_requests.get((profile, cn))
+        if node_data is not None:
+            return (profile_data, node_data)
+
         try:
             # Get node infos
             node_data = self._send('get_node', params={'cn': cn, 'profile': profile})
         except Exception as err:
             raise Exception(err)
 
+        san = ''
+        if len(node_data['Sans']):
+            sans = self._build_sans(list(node_data['Sans']))
+            san = ' -reqexts SAN -config <(cat /etc/ssl/openssl.cnf <(printf "[SAN]\\nsubjectAltName={san}"))'.format(san=sans)
+        node_data = {'DN': node_data['DN'], 'Sans': list(node_data['Sans']), 'san_option': san}
+        self.node_requests.set((profile, cn), node_data)
+
+        return (profile_data, node_data)
+
+    def _command_template(self, profile, profile_data):
+        """openssl command template of a profile, built once
+        """
+        template = self._templates.get(profile)
+        if template is None:
+            template = 'openssl req -new -{d} -nodes -newkey {kt}:{kl} -keyout {{n}}.key -subj "{{s}}"{{san}} -out {{n}}.csr'.format(d=profile_data['digest'], kt=profile_data['keyType'], kl=profile_data['keyLen'])
+            self._templates[profile] = template
+
+        return template
+
+    def _forget_profile(self, name):
+        """Drop cached data built from a profile
+        """
+        self._templates.pop(name, None)
+        self.node_requests.discard(lambda k: k[0] == name)
+
+    def _forget_node(self, *dns):
+        """Drop cached request infos of nodes
+        """
+        cns = set()
+        for dn in dns:
+            try:
+                cns.add(self._get_cn(dn))
+            except Exception:
+                # Unusual DN, can not guess entries
+                self.node_requests.clear()
+                return
+        self.node_requests.discard(lambda k: k[1] in cns)
+
+    def _keychain_params(self, profile, cn):
+        """Arguments of generate_keychain for a node
+        """
+        (profile_data, node_data) = self._node_request(profile, cn)
+
+        return {
+            'key_type': profile_data['keyType'],
+            'key_len': profile_data['keyLen'],
+            'digest': profile_data['digest'],
+            'dn': node_data['DN'],
+            'sans': list(node_data.get('Sans') or []),
+        }
+
+    def generate_command(self, profile, data, filename=None):
+        try:
+            cn = data['cn']
+        except KeyError:
+            raise Exception('Missing CN value')
+
+        (profile_data, node_data) = self._node_request(profile, cn)
+
         if filename is None:
             filename = "{p}.{n}".format(p=profile, n=cn)
 
-        cmd = 'openssl req -new -{d} -nodes -newkey {kt}:{kl} -keyout {n}.key -subj "{s}"'.format(d=profile_data['digest'], kt=profile_data['keyType'], kl=profile_data['keyLen'], n=filename, s=node_data['DN'])
-        if len(node_data['Sans']):
-            sans = self._build_sans(node_data['Sans'])
-            cmd += ' -reqexts SAN -config <(cat /etc/ssl/openssl.cnf <(printf "[SAN]\\nsubjectAltName={san}"))'.format(san=sans)
-        
-        cmd += " -out {n}.csr".format(n=filename)
-        
-        return cmd
+        return self._command_template(profile, profile_data).format(n=filename, s=node_data['DN'], san=node_data['san_option'])
 
     def sign_node(self, data):
         try:
@@ -212,8 +752,60 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception(err)
 
+        try:
+            self._cache_cert(results['dn'], results['certificate'])
+            values = self._cert_values(results['certificate'])
+            # Node may be unknown to replica yet
+            if results.get('profile'):
+                values['Profile'] = results['profile']
+            try:
+                values['CN'] = self._get_cn(results['dn'])
+            except Exception:
+                pass
+            self._node_event('sign', results['dn'], values)
+        except (KeyError, TypeError, AttributeError):
+            pass
+
         return results
 
+    def sign_nodes(self, requests, window=SIGN_WINDOW):
+        """Sign many CSR concurrently, with at most 'window' CA calls in flight
+        Yield (index, result, error) as each signature completes
+        """
+        window  = max(1, int(window))
+        items   = enumerate(requests)
+        pending = dict({})
+        workers = concurrent.futures.ThreadPoolExecutor(max_workers=window)
+        try:
+            while True:
+                for (index, data) in itertools.islice(items, window - len(pending)):
+                    pending[workers.submit(self.sign_node, data)] = index
+                if not pending:
+                    break
+                (done, _) = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        yield (index, future.result(), None)
+                    except Exception as err:
+                        yield (index, None, err)
+        finally:
+            # Client may be gone, do not wait for running calls
+            workers.shutdown(wait=False)
+
+    def sign_results(self, requests, window=SIGN_WINDOW):
+        """Like sign_nodes, but yield result dicts with item 'index'
+        and 'status', and either certificate details or error 'message'
+        """
+        for (index, result, error) in self.sign_nodes(requests, window=window):
+            if error is not None:
+                yield {'index': index, 'status': 'error', 'message': str(error)}
+                continue
+            try:
+                yield {'index': index, 'status': 'success', 'certificate': result['certificate'], 'dn': result['dn'], 'profile': result['profile']}
+            except (KeyError, TypeError):
+                yield {'index': index, 'status': 'error', 'message': 'Missing mandatory param'}
+
     def list_admins(self):
         try:
             data = self._send('list_admins')
@@ -239,19 +831,40 @@ class RegistrationAuthority(server.utils.Tools):
         return result
 
     def list_profiles(self):
+        """Return profiles from local store, reloaded from CA when outdated
+        """
+        if not self.profiles.fresh():
+            try:
+                self.refresh_profiles()
+            except Exception as err:
+                if not len(self.profiles):
+                    raise Exception(err)
+                # Serve known profiles, try again later
+                self.output('Unable to refresh profiles: {e}'.format(e=err), level="WARNING")
+                self.profiles.touch()
+
+        return self.profiles.all()
+
+    def refresh_profiles(self):
+        """Reload profiles from CA, return True if they changed
+        """
         try:
             data = self._send('list_profiles')
         except Exception as err:
             raise Exception(err)
-        
-        for name, profile in data.items():
-            # Setup correct name
-            profile['name'] = name
-            # Store profiles for next time
-            if name not in self.profiles.keys():
-                self.profiles[name] = profile
 
-        return list(self.profiles.values())
+        changed = self.profiles.load(data)
+        for name in changed:
+            self._forget_profile(name)
+        if changed:
+            self.output('Profiles updated (version {v}): {n}'.format(v=self.profiles.version, n=', '.join(sorted(changed))), level="DEBUG")
+
+        return bool(changed)
+
+    def _profiles_task(self):
+        """Keep profiles fresh in background
+        """
+        self.refresh_profiles()
 
     def add_profile(self, params):
         try:
@@ -259,6 +872,14 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception(err)
 
+        # Profile has been created successfuly
+        try:
+            self.profiles.put(params['name'], params)
+            self._forget_profile(params['name'])
+        except (KeyError, TypeError):
+            # Unknown format, get it from CA
+            self.scheduler.trigger('profiles')
+
         return data
 
     def update_profile(self, name, params):
@@ -274,10 +895,12 @@ class RegistrationAuthority(server.utils.Tools):
             raise Exception(err)
 
         # Profile has been updated successfuly
-        try:
-            del self.profiles[original]
-        except KeyError:
-            pass
+        profile = dict(self.profiles.get(original, {}))
+        profile.update({k: v for k, v in params.items() if k != 'origName'})
+        new_name = profile.get('name', name)
+        self.profiles.put(new_name, profile, replace=original)
+        self._forget_profile(original)
+        self._forget_profile(new_name)
 
         return data
 
@@ -291,21 +914,218 @@ class RegistrationAuthority(server.utils.Tools):
             raise Exception(err)
 
         # Profile has been removed successfuly
-        try:
-            del self.profiles[name]
-        except KeyError:
-            pass
+        self.profiles.remove(name)
+        self._forget_profile(name)
 
         return data
 
 
-    def list_nodes(self):
+    def list_nodes(self, refresh=False):
+        """Return nodes from local replica, synced with CA when outdated
+        """
+        self._check_nodes(refresh)
+
+        return self.nodes.all()
+
+    def _check_nodes(self, refresh=False):
+        synced = self.nodes.synced
+        if refresh or (synced is None) or ((time.time() - synced) > NODES_SYNC_TTL):
+            try:
+                self.sync_nodes()
+            except Exception as err:
+                if self.nodes.synced is None:
+                    raise Exception(err)
+                self.output('Serve outdated nodes list: {e}'.format(e=err), level="WARNING")
+
+    def sync_nodes(self):
+        """Get full nodes list from CA and apply differences to replica
+        """
+        with self._nodes_lock:
+            try:
+                data = self._send('list_nodes')
+            except Exception as err:
+                raise Exception(err)
+
+            changes = self.nodes.load(data)
+
+        if changes:
+            self.output('{n} nodes changes found on CA'.format(n=changes), level="DEBUG")
+
+    def _changes_result(self, since, changes):
+        """Nodes changes answer, revisions are sent as cursors
+        """
+        changes = [dict(c, revision=self.nodes.cursor(c['revision'])) for c in changes]
+
+        return {'revision': changes[-1]['revision'] if changes else since, 'reset': False, 'changes': changes}
+
+    def node_changes(self, since):
+        """Return nodes changes after 'since' cursor
+        If cursor comes from another RA process or changes are too old
+        to be known, whole nodes list is returned with 'reset' flag set.
+        """
+        self._check_nodes()
+
+        revision = self.nodes.revision
+        start = self.nodes.revision_of(since)
+        changes = None if start is None else self.nodes.changes(start)
+        if changes is None:
+            return {'revision': self.nodes.cursor(revision), 'reset': True, 'nodes': self.nodes.all()}
+
+        return self._changes_result(since, changes)
+
+    def wait_node_changes(self, since, timeout):
+        """Return nodes changes after 'since' cursor, waiting up to
+        'timeout' seconds for one to happen. Only local replica is used,
+        if cursor is unknown or changes are too old 'reset' flag is set.
+        """
+        start = self.nodes.revision_of(since)
+        if start is not None:
+            self.nodes.wait(start, timeout)
+
+        revision = self.nodes.revision
+        changes = None if start is None else self.nodes.changes(start)
+        if changes is None:
+            return {'revision': self.nodes.cursor(revision), 'reset': True, 'changes': []}
+
+        return self._changes_result(since, changes)
+
+    def _node_event(self, action, dn, values=None):
+        """Apply RA operation on nodes replica
+        CA remains the reference, differences are fixed by periodic sync
+        """
         try:
-            self.nodes = self._send('list_nodes')
+            self.nodes.apply(action, dn, values)
         except Exception as err:
-            raise Exception(err)
+            self.output('Unable to update node {d}: {e}'.format(d=dn, e=err), level="WARNING")
+
+    def _cert_values(self, cert_pem):
+        """Node values from an issued certificate
+        """
+        try:
+            infos = self._cert_infos(cert_pem)
+        except Exception:
+            return {'State': 'Valid'}
+
+        # Same representation as CA nodes list
+        return {'State': 'Valid', 'Serial': '{s:X}'.format(s=infos['serial']), 'Expire': infos['not_after'].strftime('%Y%m%d%H%M%SZ')}
+
+    def query_nodes(self, params):
+        """Filter, sort and paginate nodes list
+        Filters: 'profile', 'state', 'cn' (prefix), 'expires_after' and
+        'expires_before' (dates), 'expires_within' (days from now).
+        Sort with 'sort' field name, prefixed by '-' for descending order.
+        Pagination starts when 'limit' or 'cursor' is set, the 'next' cursor
+        returned is used to get the following page.
+        """
+        sort = params.get('sort', 'dn')
+        reverse = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in NODES_SORT:
+            raise Exception('Invalid sort field')
+
+        paginate = ('limit' in params) or ('cursor' in params)
+        try:
+            limit = min(NODES_MAX_PAGE, max(1, int(params.get('limit', NODES_PAGE))))
+        except ValueError:
+            raise Exception('Invalid limit')
+
+        try:
+            (after, before) = self._expiry_window(params)
+        except ValueError as err:
+            raise Exception('Invalid filter: {e}'.format(e=err))
+        matches = self._node_filter(params)
+
+        self._check_nodes()
+        revision = self.nodes.cursor()
+        if (after is not None) or (before is not None):
+            # Range query on expiry index
+            candidates = self.nodes.expiring(after=after, before=before)
+        elif params.get('cn'):
+            # Prefix query on CN index
+            candidates = self.nodes.by_cn(params['cn'], prefix=True)
+        else:
+            candidates = self.nodes.all()
+        nodes = [n for n in candidates if matches(n)]
+        keyed = sorted([(self._node_sort_key(n, sort), n) for n in nodes], key=lambda x: x[0], reverse=reverse)
+
+        if 'cursor' in params:
+            last = self._decode_cursor(params['cursor'])
+            if reverse:
+                keyed = [x for x in keyed if x[0] < last]
+            else:
+                keyed = [x for x in keyed if x[0] > last]
+
+        result = {'total': len(nodes), 'next': None, 'revision': revision}
+        if paginate and (len(keyed) > limit):
+            keyed = keyed[:limit]
+            result['next'] = self._encode_cursor(keyed[-1][0])
+        result['nodes'] = [x[1] for x in keyed]
+
+        return result
+
+    def _expiry_window(self, params):
+        """Return expiry filters as (after, before) UTC timestamps
+        """
+        after  = None
+        before = None
+
+        if params.get('expires_after'):
+            after = self._parse_date(params['expires_after'])
+            if after is None:
+                raise ValueError('expires_after')
+        if params.get('expires_before'):
+            before = self._parse_date(params['expires_before'])
+            if before is None:
+                raise ValueError('expires_before')
+        if params.get('expires_within'):
+            limit = datetime.datetime.utcnow() + datetime.timedelta(days=float(params['expires_within']))
+            before = limit if before is None else min(before, limit)
+
+        epoch = datetime.datetime(1970, 1, 1)
+        if after is not None:
+            after = (after - epoch).total_seconds()
+        if before is not None:
+            before = (before - epoch).total_seconds()
+
+        return (after, before)
+
+    def _node_filter(self, params):
+        """Build node matching function from filters (except expiry)
+        """
+        profile = params.get('profile')
+        state   = params.get('state')
+        prefix  = params.get('cn')
+
+        state = state.lower() if state else None
+
+        def matches(node):
+            if profile and (node.get('Profile') != profile):
+                return False
+            if state and (str(node.get('State', '')).lower() != state):
+                return False
+            if prefix and not str(node.get('CN', '')).startswith(prefix):
+                return False
+            return True
+
+        return matches
+
+    def _node_sort_key(self, node, field):
+        """Comparable (and JSON serializable) sort key, DN break ties
+        """
+        if field == 'expire':
+            value = self._parse_date(node.get('Expire'))
+            if value is not None:
+                value = (value - datetime.datetime(1970, 1, 1)).total_seconds()
+        elif field == 'serial':
+            try:
+                value = self._parse_serial(node['Serial'])
+            except Exception:
+                value = None
+        else:
+            value = node.get(field.upper() if field in ('dn', 'cn') else field.capitalize())
+            value = None if value is None else str(value)
 
-        return self.nodes
+        return (value is None, value if value is not None else 0, str(node.get('DN', '')))
 
     def register_node(self, params):
         try:
@@ -314,11 +1134,14 @@ class RegistrationAuthority(server.utils.Tools):
             raise Exception(err)
 
         try:
-            data = self._send('register', params=data)
+            result = self._send('register', params=data)
         except Exception as err:
             raise Exception(err)
 
-        return data
+        self._node_event('register', data['dn'], {'CN': data['cn'], 'Profile': data['profile']})
+        self._forget_node(data['dn'])
+
+        return result
 
     def update_node(self, params):
         try:
@@ -327,17 +1150,58 @@ class RegistrationAuthority(server.utils.Tools):
             raise Exception(err)
 
         try:
-            data = self._send('update', params=data)
+            result = self._send('update', params=data)
         except Exception as err:
             raise Exception(err)
 
-        return data
+        original = params.get('requested_dn', data['dn'])
+        if original != data['dn']:
+            self._node_event('delete', original)
+        self._node_event('update', data['dn'], {'CN': data['cn'], 'Profile': data['profile']})
+        self._forget_node(original, data['dn'])
+
+        return result
 
     def renew_node(self, dn):
+        """Renew node certificate
+        Concurrent renewals of a DN share the same CA call, and a node
+        renewed less than RENEW_CACHE_TTL seconds ago gets the same
+        certificate again. Raise RAOverloadedError if too many renewals
+        are already waiting for CA.
+        """
+        data = self._renewed.get(dn)
+        if data is None:
+            data = self._renewals.do(dn, lambda: self._renew(dn))
+
+        return dict(data)
+
+    def _renew(self, dn):
+        data = self._renewed.get(dn)
+        if data is not None:
+            return data
+
+        if not self._renew_limiter.acquire():
+            # Spread clients retries
+            delay = RENEW_RETRY_AFTER * random.uniform(1, 2)
+            raise server.core.RAOverloadedError('Too many renewals in progress', retry_after=delay)
         try:
             data = self._send('renew', params={'dn': dn})
+        except server.core.RAOverloadedError:
+            # Client gets its Retry-After
+            raise
         except Exception as err:
             raise Exception(err)
+        finally:
+            self._renew_limiter.release()
+        self._renewed.set(dn, data)
+
+        # Previous certificate is replaced
+        self._uncache_cert(dn=dn)
+        try:
+            self._cache_cert(dn, data['certificate'])
+            self._node_event('renew', dn, self._cert_values(data['certificate']))
+        except (KeyError, TypeError):
+            self._node_event('renew', dn)
 
         return data
 
@@ -359,6 +1223,13 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception(err)
 
+        # Publish revocation
+        self._forget_ocsp(params['DN'])
+        self._node_event('revoke', params['DN'], {'State': 'Revoked'})
+        self._uncache_cert(dn=params['DN'])
+        self._renewed.pop(params['DN'])
+        self.scheduler.trigger('crl')
+
         return data
 
     def unrevoke_node(self, params):
@@ -374,6 +1245,11 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception(err)
 
+        # Publish revocation removal
+        self._forget_ocsp(params['DN'])
+        self._node_event('unrevoke', params['DN'], {'State': 'Valid'})
+        self.scheduler.trigger('crl')
+
         return data
 
     def remove_node(self, params):
@@ -394,38 +1270,266 @@ class RegistrationAuthority(server.utils.Tools):
         except Exception as err:
             raise Exception(err)
 
+        self._node_event('delete', params['DN'])
+        self._forget_node(params['DN'])
+        self._renewed.pop(params['DN'])
+        self._uncache_cert(dn=params['DN'])
+
         return data
 
+    def start_services(self, crl_hook=None, stapling=False, key_pool=0):
+        """Start background tasks
+        'crl_hook' is an optional command run each time crl.pem changes
+        (ie: to reload web server)
+        'stapling' enable OCSP answers pre-generation for all certificates
+        'key_pool' enable server-side enrollment, with this number of keys
+        pre-generated for each profile key type
+        """
+        self._crl_hook = crl_hook
+        self.scheduler.add('crl', self._crl_task, CRL_INTERVAL)
+        self.scheduler.add('nodes', self.sync_nodes, NODES_SYNC_INTERVAL, delay=NODES_SYNC_INTERVAL)
+        # Refresh a bit before profiles are considered outdated
+        self.scheduler.add('profiles', self._profiles_task, PROFILES_TTL * 0.8, delay=PROFILES_TTL * 0.8)
+        self.scheduler.add('options', self._options_task, OPTIONS_TTL * 0.8)
+
+        if stapling:
+            try:
+                self.ocsp_store = server.utils.OCSPStore(os.path.join(self._path, 'ocsp'))
+                found = self.ocsp_store.load(self._ocsp_response_infos)
+            except Exception as err:
+                raise Exception('Unable to load OCSP store: {e}'.format(e=err))
+            self.output('{n} pre-generated OCSP answers loaded'.format(n=found))
+            self.scheduler.add('ocsp', self.pregenerate_ocsp, OCSP_PREGEN_INTERVAL)
+
+        if key_pool:
+            try:
+                self.key_pool = server.utils.KeyPool(self._logger, os.path.join(self._path, 'keys'), self._key_secret(), size=key_pool, workers=KEY_POOL_WORKERS)
+                for profile in self.profiles.values():
+                    self.key_pool.add(profile['keyType'], profile['keyLen'])
+            except Exception as err:
+                raise Exception('Unable to setup key pool: {e}'.format(e=err))
+            self.scheduler.add('keys', self._keys_task, KEY_POOL_INTERVAL)
+
+        try:
+            self.jobs = server.utils.JobQueue(self._logger, os.path.join(self._path, 'jobs'), workers=JOBS_WORKERS)
+            self.jobs.register('crl', self._job_crl)
+            self.jobs.register('revoke', self._job_revoke)
+            self.jobs.register('sign', self._job_sign)
+            queued = self.jobs.load()
+        except Exception as err:
+            raise Exception('Unable to load jobs: {e}'.format(e=err))
+        if queued:
+            self.output('{n} unfinished jobs queued again'.format(n=queued))
+        self.jobs.start()
+        self.scheduler.add('jobs', self._jobs_task, 3600)
+
+        self.scheduler.start()
+
+    def close(self):
+        """Stop background tasks and release CA connections
+        """
+        self.scheduler.stop()
+        if self.jobs is not None:
+            self.jobs.stop()
+        self._connector.close()
+
+    def _key_secret(self):
+        """Return passphrase protecting pooled keys, created on first use
+        """
+        path = os.path.join(self._path, 'keys.secret')
+        if not os.path.isfile(path):
+            server.utils.write_file(path, base64.b64encode(os.urandom(32)), mode=0o600)
+        with open(path, 'rb') as raw:
+            return raw.read().strip()
+
+    def enroll(self, profile, data):
+        """Server-side enrollment: return a private key (encrypted with
+        optional 'passphrase') and its signed certificate for node 'cn'
+        Keys come from pre-generated pool when available
+        """
+        if self.key_pool is None:
+            raise Exception('Server-side enrollment is disabled')
+        try:
+            cn = data['cn']
+        except (KeyError, TypeError):
+            raise Exception('Missing CN value')
+
+        params = self._keychain_params(profile, cn)
+        self.key_pool.add(params['key_type'], params['key_len'])
+        key = self.key_pool.take(params['key_type'], params['key_len'])
+        self.scheduler.trigger('keys')
+        if key is None:
+            self.output('Key pool {t}:{l} is empty'.format(t=params['key_type'], l=params['key_len']), level="WARNING")
+            key = server.utils.generate_key(params['key_type'], params['key_len'])
+
+        csr = server.utils.build_csr(key, params['digest'], params['dn'], params['sans'])
+        result = self.sign_node({'CSR': csr.decode('utf-8')})
+
+        passphrase = data.get('passphrase')
+        return {
+            'key': server.utils.key_pem(key, passphrase.encode('utf-8') if passphrase else None).decode('utf-8'),
+            'certificate': result['certificate'],
+            'dn': result['dn'],
+            'profile': result['profile'],
+        }
+
+    def submit_job(self, kind, params=None):
+        """Queue a background job (crl, revoke or sign), return its ID
+        """
+        if self.jobs is None:
+            raise Exception('Jobs are only available in listen mode')
+
+        if kind in ('revoke', 'sign') and not isinstance(params, list):
+            raise Exception('Job parameters must be a list')
+
+        try:
+            return self.jobs.submit(kind, params)
+        except ValueError as err:
+            raise Exception(err)
+
+    def _keys_task(self):
+        """Keep key pools full in background
+        """
+        generated = self.key_pool.refill()
+        if generated:
+            self.output('{n} keys added to pool'.format(n=generated), level="DEBUG")
+
+    def _jobs_task(self):
+        """Remove old finished jobs in background
+        """
+        removed = self.jobs.cleanup()
+        if removed:
+            self.output('{n} finished jobs removed'.format(n=removed), level="DEBUG")
+
+    def _job_crl(self, job, report):
+        return {'changed': self.refresh_crl()}
+
+    def _job_revoke(self, job, report):
+        """Revoke a list of {'DN', 'Reason'}
+        Nodes already handled by an interrupted run are skipped
+        """
+        done = set(item['index'] for item in job['items'])
+        report(total=len(job['params']))
+        errors = len([i for i in job['items'] if i['status'] == 'error'])
+        for index, params in enumerate(job['params']):
+            if index in done:
+                continue
+            try:
+                self.revoke_node(params)
+                report(item={'index': index, 'status': 'success', 'dn': params['DN']})
+            except Exception as err:
+                errors += 1
+                report(item={'index': index, 'status': 'error', 'message': str(err)})
+
+        return {'errors': errors}
+
+    def _job_sign(self, job, report):
+        """Sign a list of CSR (or {'CSR'}), results are job items
+        CSR already signed by an interrupted run are not sent again
+        """
+        done = set(item['index'] for item in job['items'])
+        batch = [{'CSR': item} if isinstance(item, str) else item for item in job['params']]
+        remaining = [index for index in range(len(batch)) if index not in done]
+        report(total=len(batch))
+        errors = len([i for i in job['items'] if i['status'] == 'error'])
+        for item in self.sign_results([batch[index] for index in remaining]):
+            item['index'] = remaining[item['index']]
+            if item['status'] == 'error':
+                errors += 1
+            report(item=item)
+
+        return {'errors': errors}
+
+    def _crl_task(self):
+        """Refresh CRL and plan next run ahead of its nextUpdate
+        """
+        self.refresh_crl()
+
+        expires = self.crl_file.get()['expires']
+        if expires is None:
+            return CRL_INTERVAL
+
+        # Leave half of remaining validity as safety margin
+        remaining = (expires - datetime.datetime.utcnow()).total_seconds()
+        return min(CRL_INTERVAL, max(60, remaining / 2))
+
     def _send(self, task, params=None):
+        """Send task to CA with its deadline
+        Identical read-only tasks in flight at the same time share a single
+        CA call and its answer.
+        """
         if task is None:
             raise Exception('Can not send empty event')
 
+        if task not in IDEMPOTENT_TASKS:
+            return self._call(task, params)
+
         try:
-            context = zmq.Context()
-            self.output("Connect socket use ZMQ version {v}".format(v=zmq.zmq_version()), level="DEBUG")
-            backend_socket = context.socket(zmq.REQ)
-            backend_socket.connect('{s}'.format(s=self._ca_url))
-            self.output("Socket connected to {host}".format(host=self._ca_url), level="DEBUG")
-            backend_socket.send_json({'TASK': task, 'PARAMS':params})
-        except zmq.ZMQError as err:
-            raise Exception("Stalker process failed with: {e}".format(e=err))
-        except AttributeError as err:
-            raise Exception("Missing config options: {e}".format(e=err))
-        except Exception as err:
-            raise Exception("Error on connection: {e}".format(e=err))
+            key = (task, json.dumps(params, sort_keys=True))
+        except (TypeError, ValueError):
+            return self._call(task, params)
+
+        return self._flights.do(key, lambda: self._call(task, params))
+
+    def _call(self, task, params):
+        """Send task to CA, with retries and fallback
+        Read-only tasks are retried with jittered backoff on connection errors.
+        Once CA is considered down, calls fail fast and last known answer is
+        served when there is one.
+        """
+        timeout  = self._timeouts.get(task, DEFAULT_TIMEOUT)
+        attempts = (1 + self._retries) if task in IDEMPOTENT_TASKS else 1
+        fallback = (task in FALLBACK_TASKS) and (params is None)
+
+        for attempt in range(attempts):
+            if not self._breaker.allow():
+                err = server.core.CAUnavailableError('CA is unavailable')
+                break
+
+            if attempt:
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, 0.2 * (2 ** attempt)))
+
+            try:
+                data = self._request(task, params, timeout)
+            except server.core.CAPoolExhaustedError:
+                # RA side congestion, not a CA failure
+                self._breaker.cancel()
+                raise
+            except server.core.CAConnectionError as e:
+                err = e
+                self._breaker.failure()
+                self.output('CA {t} call failed ({a}/{n}): {e}'.format(t=task, a=attempt+1, n=attempts, e=err), level="WARNING")
+                continue
+            except Exception:
+                # Even an error message means CA is alive
+                self._breaker.success()
+                raise
+
+            self._breaker.success()
+            if fallback:
+                self._fallbacks[task] = data
+            return data
+
+        if fallback and (task in self._fallbacks):
+            self.output('Serve last known {t} answer: {e}'.format(t=task, e=err), level="WARNING")
+            return self._fallbacks[task]
+
+        raise Exception("Error on connection: {e}".format(e=err))
 
+    def _request(self, task, params, timeout):
+        """Single request/answer exchange with CA
+        """
         try:
-            answer = backend_socket.recv_json()
-        except zmq.ZMQError as e:
-            raise Exception('ZMQ Error: {err}'.format(err=e))
-        except ValueError:
-            raise Exception('Received unparsable message')
+            answer = self._connector.send({'TASK': task, 'PARAMS':params}, timeout=timeout)
+        except AttributeError as err:
+            raise Exception("Missing config options: {e}".format(e=err))
         except SystemExit:
             raise Exception('Poison listener...')
-        
+
         try:
             evt = answer['EVENT']
-        except KeyError:
+        except (KeyError, TypeError):
             raise Exception('Invalid message')
 
         try:
@@ -442,9 +1546,4 @@ class RegistrationAuthority(server.utils.Tools):
                 raise Exception('CA Invalid error message')
             raise Exception('CA ERROR: {m}'.format(m=msg))
 
-        try:
-            backend_socket.close()
-        except Exception as err:
-            raise Exception('Unable to close socket: {e}'.format(e=err))
-
-        return data
\ No newline at end of file
+        return data
@@ -5,6 +5,7 @@ from flask import jsonify, request
 from flask import current_app
 from flask import Blueprint
 
+from server.core import RAOverloadedError
 from server.utils import TLSAuth
 
 def send_error(msg):
@@ -27,13 +28,14 @@ def renew():
     Client identity is get using TLS client certificate DN value
     """
     try:
-        dn = request.headers['SSL-Client-DN']
         # Handle new Nginx version: build DN using ',' and in reverse order
-        if dn and not dn.startswith('/'):
-            infos = dn.split(',')
-            infos.reverse()
-            dn = '/{i}'.format(i='/'.join(infos))
+        dn = upki_auth.normalize(request.headers['SSL-Client-DN'])
         data = current_app.ra.renew_node(dn)
+    except RAOverloadedError as err:
+        response = send_error(err)
+        response.status_code = 503
+        response.headers['Retry-After'] = str(err.retry_after)
+        return response
     except Exception as err:
         return send_error(err)
 
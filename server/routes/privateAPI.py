@@ -1,29 +1,69 @@
 # -*- coding: utf-8 -*-
+import time
+import json
 import base64
 
 from flask import jsonify, request
 from flask import current_app
 from flask import Blueprint
+from flask import Response
 
-from server.utils import TLSAuth
+from server.utils import TLSAuth, JSONStream
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson')
+
+# Events stream: seconds between keep-alive comments, max connection
+# lifetime (clients reconnect with Last-Event-ID) and reconnection delay (ms)
+EVENTS_KEEPALIVE = 15
+EVENTS_DURATION  = 300
+EVENTS_RETRY     = 3000
+
+# Bulk signing: max CSR per request and max CA calls in flight
+SIGN_BULK_MAX    = 10000
+SIGN_BULK_WINDOW = 64
 
 def send_error(msg):
     """Send back error in json
     """
     return jsonify({'status': 'error', 'message': str(msg)})
 
-upki_auth = TLSAuth()
+def send_stream(key, items, head=None, chunk_size=16384):
+    """Stream a list as JSON, or as NDJSON if client prefers it
+    NDJSON lines only contain items, other values are sent as headers.
+    Output is gzip compressed when client accepts it.
+    """
+    head = dict(head or {})
+    best = request.accept_mimetypes.best_match(('application/json',) + NDJSON_TYPES)
+    ndjson = best in NDJSON_TYPES
+    compress = request.accept_encodings['gzip'] > 0
+    if not ndjson:
+        head = dict({'status': 'success'}, **head)
+
+    stream = JSONStream(items, key, head=head, ndjson=ndjson, compress=compress, chunk_size=chunk_size)
+    response = Response(stream, mimetype=stream.mimetype)
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    if ndjson:
+        for name, value in head.items():
+            if value is not None:
+                response.headers['X-{n}'.format(n=name.capitalize())] = str(value)
+
+    return response
+
+# Seconds before admins list is reloaded from CA
+ADMINS_TTL = 300
+
+upki_auth = TLSAuth(ttl=ADMINS_TTL)
 private_api = Blueprint('private_api', __name__)
 
 @private_api.before_request
 def chek_admins():
-    # Only need to run once
-    if not len(upki_auth.groups):
-        data = current_app.ra.list_admins()
-        for adm in data:
-            dn = adm.get('dn', None)
-            if dn and (dn not in upki_auth.groups):
-                upki_auth.groups.append(dn)
+    if upki_auth.loader is None:
+        ra = current_app.ra
+        upki_auth.loader = lambda: [adm['dn'] for adm in ra.list_admins() if adm.get('dn')]
+    upki_auth.refresh()
     return check_path()
 
 @upki_auth.tls_private()
@@ -33,21 +73,84 @@ def check_path():
 
 @private_api.route('/options', methods=['GET'])
 def all_options():
+    """CA options, served from RA cache
+    Answer 304 to If-None-Match when unchanged
+    """
     try:
-        options = current_app.ra.get_options()
+        entry = current_app.ra.cached_options()
     except Exception as err:
         return send_error(err)
 
-    return jsonify({'status': 'success', 'options': options})
+    response = jsonify({'status': 'success', 'options': entry['options']})
+    response.set_etag(entry['etag'])
+    # Admin only content, always revalidated
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
 
 @private_api.route('/nodes', methods=['GET'])
 def list_nodes():
+    """List nodes, see RegistrationAuthority.query_nodes for parameters
+    With 'since' revision cursor, only changes made after it are returned
+    """
+    if 'since' in request.args:
+        try:
+            data = current_app.ra.node_changes(request.args['since'])
+        except Exception as err:
+            return send_error(err)
+        data['status'] = 'success'
+        return jsonify(data)
+
+    try:
+        data = current_app.ra.query_nodes(request.args.to_dict())
+    except Exception as err:
+        return send_error(err)
+
+    return send_stream('nodes', data['nodes'], {'total': data['total'], 'next': data['next'], 'revision': data['revision']})
+
+@private_api.route('/events', methods=['GET'])
+def node_events():
+    """Server-Sent Events stream of nodes changes
+    Event type is the operation (register, update, sign, renew, revoke,
+    unrevoke, delete, or add/update/delete from CA sync) and event id is
+    nodes revision cursor, so clients resume with Last-Event-ID (or 'since').
+    A 'reset' event means changes were lost (or RA restarted), full list
+    must be fetched.
+    """
+    ra = current_app.ra
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+
     try:
-        data = current_app.ra.list_nodes()
+        if since is None:
+            # Start from current state
+            ra.list_nodes()
+            since = ra.nodes.cursor()
     except Exception as err:
         return send_error(err)
 
-    return jsonify({'status': 'success', 'nodes': data})
+    def stream(since):
+        yield 'retry: {r}\n\n'.format(r=EVENTS_RETRY)
+        end = time.time() + EVENTS_DURATION
+        while time.time() < end:
+            data = ra.wait_node_changes(since, min(EVENTS_KEEPALIVE, end - time.time()))
+            if data['reset']:
+                since = data['revision']
+                yield 'id: {i}\nevent: reset\ndata: {d}\n\n'.format(i=since, d=json.dumps({'revision': since}))
+                continue
+            if not data['changes']:
+                yield ': keep-alive\n\n'
+                continue
+            for change in data['changes']:
+                yield 'id: {i}\nevent: {a}\ndata: {d}\n\n'.format(i=change['revision'], a=change['action'], d=json.dumps(change))
+            since = data['revision']
+
+    response = Response(stream(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Disable nginx buffering
+    response.headers['X-Accel-Buffering'] = 'no'
+
+    return response
 
 @private_api.route('/admins', methods=['GET'])
 def list_admins():
@@ -56,7 +159,7 @@ def list_admins():
     except Exception as err:
         return send_error(err)
 
-    return jsonify({'status': 'success', 'admins': data})
+    return send_stream('admins', data)
 
 @private_api.route('/admins', methods=['POST'])
 def add_admin():
@@ -70,8 +173,7 @@ def add_admin():
         except Exception as err:
             return send_error(err)
         # Update allowed admins
-        if dn not in upki_auth.groups:
-            upki_auth.groups.append(dn)
+        upki_auth.add(dn)
 
     return jsonify({'status': 'success', 'message': 'Admins created'})
 
@@ -88,8 +190,7 @@ def remove_admin(dn):
         return send_error(err)
 
     # Update allowed admins
-    if admin_dn in upki_auth.groups:
-        upki_auth.groups.remove(admin_dn)
+    upki_auth.discard(admin_dn)
 
     return jsonify({'status': 'success', 'message': 'Admin deleted'})
 
@@ -113,6 +214,65 @@ def sign_nodes():
 
     return jsonify({'status': 'success', 'message': 'Node is signed'})
 
+@private_api.route('/sign/bulk', methods=['POST'])
+def sign_bulk():
+    """Sign a batch of CSR sent as JSON array or NDJSON
+    Items are either CSR or {'CSR': ...} objects. Results are streamed back
+    as soon as each signature completes, with 'index' of item in batch.
+    """
+    try:
+        if request.mimetype in NDJSON_TYPES:
+            data = [json.loads(line) for line in request.stream if line.strip()]
+        else:
+            data = request.get_json()
+    except ValueError as err:
+        return send_error('Invalid batch: {e}'.format(e=err))
+    if not isinstance(data, list):
+        return send_error('Incorrect parameter type sent')
+    if len(data) > SIGN_BULK_MAX:
+        return send_error('Too many CSR (max: {m})'.format(m=SIGN_BULK_MAX))
+
+    batch = [{'CSR': item} if isinstance(item, str) else item for item in data]
+    try:
+        window = min(int(request.args.get('window', SIGN_BULK_WINDOW)), SIGN_BULK_WINDOW)
+    except ValueError as err:
+        return send_error('Invalid window: {e}'.format(e=err))
+
+    # Send each result as soon as available
+    return send_stream('results', current_app.ra.sign_results(batch, window=window), {'total': len(batch)}, chunk_size=0)
+
+@private_api.route('/jobs', methods=['POST'])
+def submit_job():
+    """Run an operation in background
+    Body is {'type': 'crl'|'revoke'|'sign', 'params': ...} where 'params'
+    is a list of {'DN', 'Reason'} to revoke, or of CSR to sign
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return send_error('Incorrect parameter type sent')
+
+    try:
+        job_id = current_app.ra.submit_job(data.get('type'), data.get('params'))
+    except Exception as err:
+        return send_error(err)
+
+    return jsonify({'status': 'success', 'message': 'Job queued', 'job': job_id})
+
+@private_api.route('/jobs', methods=['GET'])
+def list_jobs():
+    if current_app.ra.jobs is None:
+        return send_error('Jobs are only available in listen mode')
+
+    return send_stream('jobs', current_app.ra.jobs.list())
+
+@private_api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = current_app.ra.jobs.get(job_id) if current_app.ra.jobs is not None else None
+    if job is None:
+        return send_error('Unknown job')
+
+    return jsonify({'status': 'success', 'job': job})
+
 @private_api.route('/revoke', methods=['POST'])
 def revoke_node():
     data = request.get_json()
@@ -169,7 +329,7 @@ def list_profiles():
     except Exception as err:
         return send_error(err)
 
-    return jsonify({'status': 'success', 'profiles': data})
+    return jsonify({'status': 'success', 'profiles': data, 'version': current_app.ra.profiles.version})
 
 @private_api.route('/profiles', methods=['POST'])
 def add_profile():
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import time
 import base64
+import hashlib
+import datetime
 
-from flask import jsonify, request, send_file
+from flask import jsonify, request
 from flask import current_app
 from flask import Blueprint
 from flask import Response
@@ -9,11 +12,32 @@ from flask_cors import cross_origin
 
 public_api = Blueprint('public_api', __name__)
 
+# RFC 6960 unsuccessful answers (status only)
+OCSP_MALFORMED = b'\x30\x03\x0a\x01\x01'
+OCSP_INTERNAL  = b'\x30\x03\x0a\x01\x02'
+
+# Max HTTP cache lifetime of issued certificates
+CERT_MAX_AGE = 86400
+
 def send_error(msg):
     """Send back error in json
     """
     return jsonify({'status': 'error', 'message': str(msg)})
 
+def send_cached(cached, entry, mimetype):
+    """Send cached file content with HTTP validators
+    Answer 304 to If-None-Match / If-Modified-Since when unchanged
+    """
+    response = Response(entry['content'], mimetype=mimetype)
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.cache_control.public = True
+    response.cache_control.max_age = cached.max_age(entry)
+    if entry['expires'] is not None:
+        response.expires = entry['expires']
+
+    return response.make_conditional(request)
+
 @public_api.route('/certs/<node>', methods=['GET'])
 @cross_origin()
 def retrieve(node):
@@ -22,42 +46,150 @@ def retrieve(node):
     """
     try:
         if node == 'ca.crt':
-            ca = current_app.ra.get_ca()
+            ca = current_app.ra.cached_ca()
             # CA certificate should be accessible directly
-            return Response(ca, mimetype='application/x-x509-ca-cert')
+            return send_cached(current_app.ra.ca_file, ca, 'application/x-x509-ca-cert')
         elif node == 'crl.pem':
-            crl = current_app.ra.get_crl()
+            crl = current_app.ra.cached_crl()
             # CRL should be accessible directly
-            return Response(crl, mimetype='application/pkix-crl')
+            return send_cached(current_app.ra.crl_file, crl, 'application/pkix-crl')
         else:
             try:
                 dn = base64.b64decode(node).decode("utf-8")
-                certificate = current_app.ra.download_node({'dn': dn})
+                cert = current_app.ra.cached_node(dn)
             except Exception as err:
                 return send_error(err)
     except Exception as err:
         return send_error(err)
 
-    return jsonify({'status': 'success', 'certificate': certificate})
+    response = jsonify({'status': 'success', 'certificate': cert['certificate']})
+    # Issued certificate never changes, only renewal replace it
+    max_age = CERT_MAX_AGE
+    if cert['not_after'] is not None:
+        max_age = min(max_age, max(0, int((cert['not_after'] - datetime.datetime.utcnow()).total_seconds())))
+    response.set_etag(cert['etag'])
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+
+    return response.make_conditional(request)
+
+def send_ocsp(answer):
+    """Send DER OCSP answer with caching headers (RFC 5019)
+    so web servers and HTTP caches can absorb repeated lookups
+    """
+    response = Response(answer['der'], mimetype='application/ocsp-response')
+    infos = answer['infos']
+    if not infos['successful']:
+        response.cache_control.no_store = True
+        return response
+
+    if infos['next_update'] is None:
+        max_age = current_app.ra.ocsp_cache.ttl
+    else:
+        max_age = max(0, int((infos['next_update'] - datetime.datetime.utcnow()).total_seconds()))
+        response.expires = infos['next_update']
+
+    response.set_etag(hashlib.sha1(answer['der']).hexdigest())
+    response.last_modified = infos['this_update']
+    response.cache_control.public = True
+    response.cache_control.no_transform = True
+    response.cache_control.must_revalidate = True
+    response.cache_control.max_age = max_age
+
+    return response.make_conditional(request)
+
+def ocsp_der(request_der):
+    """Answer DER OCSP request, errors are sent as OCSP answers
+    """
+    try:
+        answer = current_app.ra.ocsp_answer({'request': base64.b64encode(request_der).decode('utf-8')})
+    except ValueError:
+        return Response(OCSP_MALFORMED, mimetype='application/ocsp-response')
+    except Exception as err:
+        current_app.ra.output('OCSP error: {e}'.format(e=err), level="ERROR")
+        return Response(OCSP_INTERNAL, mimetype='application/ocsp-response')
+
+    return send_ocsp(answer)
 
 @public_api.route('/ocsp', methods=['POST'])
 @cross_origin()
 def ocsp():
     """Online Certificate Status Protocol endpoint
+    Accept DER requests (application/ocsp-request) as well as JSON
     """
+    if request.mimetype == 'application/ocsp-request':
+        return ocsp_der(request.get_data())
+
     data = request.get_json()
     try:
-        result = current_app.ra.check_ocsp(data)
+        answer = current_app.ra.ocsp_answer(data)
     except Exception as err:
         return send_error(err)
 
+    # OCSP answer are binary
+    return send_ocsp(answer)
+
+@public_api.route('/ocsp/<path:encoded>', methods=['GET'])
+@cross_origin()
+def ocsp_get(encoded):
+    """Online Certificate Status Protocol endpoint using GET (RFC 6960 A.1)
+    Request is DER encoded then base64 encoded in URL
+    """
+    try:
+        # Also accept url-safe alphabet and missing padding
+        encoded = encoded.replace('-', '+').replace('_', '/')
+        request_der = base64.b64decode(encoded + '=' * (-len(encoded) % 4))
+    except Exception:
+        return Response(OCSP_MALFORMED, mimetype='application/ocsp-response')
+
+    return ocsp_der(request_der)
+
+@public_api.route('/stapling', methods=['GET'])
+@cross_origin()
+def stapling():
+    """Bulk download of pre-generated OCSP answers for stapling servers
+    Use 'since' (timestamp from previous call) to only get updated answers
+    and 'serials' (comma separated hexadecimal values) to filter them
+    """
+    store = current_app.ra.ocsp_store
+    if store is None:
+        return send_error('OCSP stapling is not enabled')
+
+    try:
+        since = request.args.get('since', None)
+        if since is not None:
+            since = float(since)
+        serials = request.args.get('serials', None)
+        if serials is not None:
+            serials = set([current_app.ra._parse_serial(s) for s in serials.split(',') if s])
+    except Exception as err:
+        return send_error('Invalid parameter: {e}'.format(e=err))
+
+    now = time.time()
+    answers = dict({})
+    for (serial, der) in store.items(since=since, serials=serials):
+        answers['{s:X}'.format(s=serial)] = base64.b64encode(der).decode('utf-8')
+
+    return jsonify({'status': 'success', 'time': now, 'responses': answers})
+
+@public_api.route('/status/<serial>', methods=['GET'])
+@cross_origin()
+def status(serial):
+    """Revocation status of a certificate serial (hexadecimal)
+    Answered from local CRL index when possible
+    """
     try:
-        ocsp_response = base64.decodebytes(result['response'])
+        result = current_app.ra.serial_status(serial)
     except Exception as err:
         return send_error(err)
 
-    # OCSP answer are binary
-    return send_file(ocsp_response, mimetype="application/ocsp-response")
+    data = {'status': 'success', 'serial': '{s:X}'.format(s=result['serial']), 'state': result['state']}
+    if result['state'] == 'revoked':
+        data['reason'] = result['reason']
+        if result['revocation_date'] is not None:
+            data['revocation_date'] = result['revocation_date'].strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    return jsonify(data)
 
 @public_api.route('/certify', methods=['POST'])
 @cross_origin()
@@ -84,6 +216,21 @@ def certify():
 
     return jsonify({'status': 'success', 'certificate': result['certificate'], 'dn': result['dn'], 'profile': result['profile']})
 
+@public_api.route('/enroll/<profile>', methods=['POST'])
+@cross_origin()
+def enroll(profile):
+    """Server-side enrollment, for clients unable to generate keys
+    Return private key (encrypted if 'passphrase' is set) and certificate
+    Only available if RA is started with a key pool
+    """
+    data = request.get_json()
+    try:
+        result = current_app.ra.enroll(profile, data)
+    except Exception as err:
+        return send_error(err)
+
+    return jsonify({'status': 'success', 'key': result['key'], 'certificate': result['certificate'], 'dn': result['dn'], 'profile': result['profile']})
+
 @public_api.route('/magic/<profile>', methods=['POST'])
 @cross_origin()
 def magic(profile):
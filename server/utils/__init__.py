@@ -1,9 +1,35 @@
 from .common import Common
 from .tools import Tools
 from .tlsauth import TLSAuth
+from .cachedFile import CachedFile
+from .scheduler import Scheduler
+from .lruCache import LRUCache
+from .revocationIndex import RevocationIndex
+from .ocspStore import OCSPStore
+from .nodeStore import NodeStore
+from .jsonStream import JSONStream
+from .jobQueue import JobQueue
+from .keychain import generate_keychain, generate_key, build_csr, key_pem, write_file
+from .keyPool import KeyPool
+from .profileStore import ProfileStore
 
 __all__ = (
     'Common',
     'Tools',
-    'TLSAuth'
+    'TLSAuth',
+    'CachedFile',
+    'Scheduler',
+    'LRUCache',
+    'RevocationIndex',
+    'OCSPStore',
+    'NodeStore',
+    'JSONStream',
+    'JobQueue',
+    'generate_keychain',
+    'generate_key',
+    'build_csr',
+    'key_pem',
+    'write_file',
+    'KeyPool',
+    'ProfileStore'
 )
\ No newline at end of file
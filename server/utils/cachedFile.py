@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+import os
+import hashlib
+import datetime
+import tempfile
+import threading
+
+class CachedFile(object):
+    """In-memory copy of a file served over HTTP
+    Keep content with its validators (strong ETag, Last-Modified) and
+    expiration date, computed once per file version.
+    'expiry' is an optional function returning the expiration datetime (UTC)
+    of a content, 'max_age' is used when no expiration date is known.
+    """
+    def __init__(self, path, expiry=None, max_age=86400):
+        self.path     = path
+        self._expiry  = expiry
+        self._max_age = int(max_age)
+        self._lock    = threading.Lock()
+        self._entry   = None
+
+    def _build(self, content, mtime):
+        expires = None
+        if self._expiry is not None:
+            expires = self._expiry(content)
+
+        return {
+            'content': content,
+            'etag': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+            'last_modified': datetime.datetime.utcfromtimestamp(int(mtime)),
+            'expires': expires,
+        }
+
+    def load(self):
+        """(Re)Load content from file
+        """
+        with open(self.path, 'rt') as raw:
+            content = raw.read()
+
+        entry = self._build(content, os.path.getmtime(self.path))
+        with self._lock:
+            self._entry = entry
+
+        return entry
+
+    def store(self, content):
+        """Atomically replace file and cached content
+        Return False if content did not change
+        """
+        with self._lock:
+            if (self._entry is not None) and (self._entry['content'] == content):
+                return False
+
+            # Write next to target so rename is atomic
+            (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.tmp.')
+            try:
+                with os.fdopen(fd, 'wt') as raw:
+                    raw.write(content)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+
+            self._entry = self._build(content, os.path.getmtime(self.path))
+
+        return True
+
+    def get(self):
+        """Return current entry, loading file if needed
+        """
+        entry = self._entry
+        if entry is None:
+            entry = self.load()
+        return entry
+
+    def stale(self):
+        entry = self._entry
+        if entry is None:
+            return True
+        if entry['expires'] is None:
+            return False
+        return datetime.datetime.utcnow() >= entry['expires']
+
+    def max_age(self, entry=None):
+        """Seconds this entry can be cached by clients
+        """
+        if entry is None:
+            entry = self.get()
+        if entry['expires'] is None:
+            return self._max_age
+        delta = entry['expires'] - datetime.datetime.utcnow()
+        return max(0, int(delta.total_seconds()))
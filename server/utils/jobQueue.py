@@ -0,0 +1,238 @@
+# -*- coding:utf-8 -*-
+
+import os
+import json
+import time
+import uuid
+import queue
+import tempfile
+import threading
+
+from .common import Common
+
+class JobQueue(Common):
+    """Background jobs run by a bounded pool of workers
+    Each job state is stored as JSON in 'path' directory, so jobs queued
+    (or interrupted while running) are run again after a restart.
+
+    Handlers are registered per job type and called with the job dict and
+    a 'report' function, used to set expected 'total' and to append item
+    results. Each item is appended to the job items log ('<id>.items', one
+    JSON per line) before report returns, so items of a previous interrupted
+    run are kept in job 'items', letting handlers skip work already done.
+    Handler return value is the job result. Finished jobs are removed
+    after 'keep' seconds.
+    """
+    def __init__(self, logger, path, workers=4, keep=86400):
+        try:
+            super(JobQueue, self).__init__(logger)
+        except Exception as err:
+            raise Exception(err)
+
+        self.path      = path
+        self._keep     = keep
+        self._size     = int(workers)
+        self._lock     = threading.Lock()
+        self._jobs     = dict({})
+        self._handlers = dict({})
+        self._queue    = queue.Queue()
+        self._threads  = list()
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def _file(self, job_id):
+        return os.path.join(self.path, '{i}.json'.format(i=job_id))
+
+    def _items_file(self, job_id):
+        return os.path.join(self.path, '{i}.items'.format(i=job_id))
+
+    def _save(self, job):
+        """Atomically write job state, items are stored apart
+        """
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.path, prefix='.tmp.')
+        try:
+            with os.fdopen(fd, 'wt') as raw:
+                json.dump({k: v for k, v in job.items() if k != 'items'}, raw)
+            os.replace(tmp_path, self._file(job['id']))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _append(self, job, item):
+        """Durably append an item to job items log
+        """
+        with open(self._items_file(job['id']), 'at') as raw:
+            raw.write(json.dumps(item) + '\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def _load_items(self, job_id):
+        """Read job items log, dropping lines interrupted by a crash
+        """
+        items = list()
+        broken = False
+        try:
+            with open(self._items_file(job_id), 'rt') as raw:
+                for line in raw:
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        broken = True
+        except FileNotFoundError:
+            return items
+
+        if broken:
+            # Next items must not be appended to a partial line
+            (fd, tmp_path) = tempfile.mkstemp(dir=self.path, prefix='.tmp.')
+            with os.fdopen(fd, 'wt') as raw:
+                raw.write(''.join(json.dumps(item) + '\n' for item in items))
+            os.replace(tmp_path, self._items_file(job_id))
+
+        return items
+
+    def load(self):
+        """Load stored jobs and queue unfinished ones again
+        Return number of queued jobs
+        """
+        jobs = list()
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.path, name), 'rt') as raw:
+                    jobs.append(json.load(raw))
+            except Exception as err:
+                self.output('Unable to load job {n}: {e}'.format(n=name, e=err), level="WARNING")
+
+        queued = 0
+        for job in sorted(jobs, key=lambda j: j['created']):
+            job['items'] = self._load_items(job['id'])
+            job['done'] = len(job['items'])
+            with self._lock:
+                self._jobs[job['id']] = job
+            if job['state'] in ('queued', 'running'):
+                job['state'] = 'queued'
+                self._save(job)
+                self._queue.put(job['id'])
+                queued += 1
+
+        return queued
+
+    def start(self):
+        for i in range(self._size - len(self._threads)):
+            worker = threading.Thread(target=self._work, name='job-worker-{i}'.format(i=i))
+            worker.daemon = True
+            worker.start()
+            self._threads.append(worker)
+
+    def stop(self):
+        for worker in self._threads:
+            self._queue.put(None)
+        for worker in self._threads:
+            worker.join(2)
+        self._threads = list()
+
+    def submit(self, kind, params=None):
+        """Queue a new job, return its ID
+        """
+        if kind not in self._handlers:
+            raise ValueError('Unknown job type: {k}'.format(k=kind))
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': kind,
+            'params': params,
+            'state': 'queued',
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'total': None,
+            'done': 0,
+            'items': [],
+            'result': None,
+            'error': None,
+        }
+        self._save(job)
+        with self._lock:
+            self._jobs[job['id']] = job
+        self._queue.put(job['id'])
+
+        return job['id']
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job, items=list(job['items']))
+
+    def list(self):
+        """Return jobs summaries (without items and result)
+        """
+        with self._lock:
+            jobs = [{k: v for k, v in job.items() if k not in ('params', 'items', 'result')} for job in self._jobs.values()]
+
+        return sorted(jobs, key=lambda j: j['created'])
+
+    def cleanup(self):
+        """Remove finished jobs older than 'keep' seconds
+        """
+        limit = time.time() - self._keep
+        with self._lock:
+            old = [j for j in self._jobs.values() if j['finished'] and (j['finished'] < limit)]
+            for job in old:
+                del self._jobs[job['id']]
+
+        for job in old:
+            for path in (self._file(job['id']), self._items_file(job['id'])):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+        return len(old)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if (job is None) or (job['state'] != 'queued'):
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        def report(item=None, total=None):
+            with self._lock:
+                if total is not None:
+                    job['total'] = total
+                    self._save(job)
+                if item is not None:
+                    # Stored before handler goes on, a restart never runs it again
+                    self._append(job, item)
+                    job['items'].append(item)
+                    job['done'] = len(job['items'])
+
+        with self._lock:
+            job['state'] = 'running'
+            job['started'] = time.time()
+            self._save(job)
+
+        try:
+            result = self._handlers[job['type']](self.get(job['id']), report)
+            with self._lock:
+                job['result'] = result
+                job['state'] = 'done'
+        except Exception as err:
+            self.output('Job {i} ({k}) failed: {e}'.format(i=job['id'], k=job['type'], e=err), level="ERROR")
+            with self._lock:
+                job['error'] = str(err)
+                job['state'] = 'failed'
+
+        with self._lock:
+            job['finished'] = time.time()
+            self._save(job)
@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+
+import json
+import zlib
+
+class JSONStream(object):
+    """Incremental JSON encoder for large lists
+    Iterating yields encoded chunks: either a JSON object whose 'key' member
+    is the list of items (other members come from 'head'), or NDJSON (one
+    item per line). Items are encoded one by one so the whole document is
+    never built in memory. Output can be gzip compressed on the fly.
+    """
+    def __init__(self, items, key, head=None, ndjson=False, compress=False, chunk_size=16384):
+        self.items      = items
+        self.key        = key
+        self.head       = head or dict({})
+        self.ndjson     = ndjson
+        self.compress   = compress
+        self.chunk_size = chunk_size
+
+    @property
+    def mimetype(self):
+        return 'application/x-ndjson' if self.ndjson else 'application/json'
+
+    def _parts(self):
+        if self.ndjson:
+            for item in self.items:
+                yield json.dumps(item, separators=(',', ':')) + '\n'
+            return
+
+        head = json.dumps(self.head, separators=(',', ':'))
+        # Open list as last member of head object
+        yield '{b}{s}{k}:['.format(b=head[:-1], s=',' if self.head else '', k=json.dumps(self.key))
+        first = True
+        for item in self.items:
+            yield ('' if first else ',') + json.dumps(item, separators=(',', ':'))
+            first = False
+        yield ']}\n'
+
+    def _chunks(self):
+        """Group small parts in chunks of about 'chunk_size' bytes
+        """
+        buffer = list()
+        size = 0
+        for part in self._parts():
+            data = part.encode('utf-8')
+            buffer.append(data)
+            size += len(data)
+            if size >= self.chunk_size:
+                yield b''.join(buffer)
+                buffer = list()
+                size = 0
+        if buffer:
+            yield b''.join(buffer)
+
+    def __iter__(self):
+        if not self.compress:
+            for chunk in self._chunks():
+                yield chunk
+            return
+
+        # wbits=31 produces gzip framing
+        encoder = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in self._chunks():
+            # Sync flush so each chunk reaches client without waiting for the next
+            yield encoder.compress(chunk) + encoder.flush(zlib.Z_SYNC_FLUSH)
+        yield encoder.flush()
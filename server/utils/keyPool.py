@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+
+import os
+import uuid
+import threading
+import concurrent.futures
+
+from .common import Common
+from .keychain import generate_key_pem, load_key, write_file
+
+class KeyPool(Common):
+    """Pools of pre-generated private keys, by key type and length
+    Keys are stored encrypted with 'passphrase' in a sub-directory of
+    'path' per pool ('rsa-4096'...). Each pool holds up to 'size' keys,
+    refill() generates missing ones in 'workers' processes.
+    A key is removed from store as soon as it has been taken.
+    """
+    def __init__(self, logger, path, passphrase, size=16, workers=2):
+        try:
+            super(KeyPool, self).__init__(logger)
+        except Exception as err:
+            raise Exception(err)
+
+        self.path        = path
+        self.size        = int(size)
+        self._passphrase = passphrase
+        self._workers    = int(workers)
+        self._lock       = threading.Lock()
+        self._pools      = dict({})
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, mode=0o700)
+
+    def _dir(self, key_type, key_len):
+        return os.path.join(self.path, '{t}-{l}'.format(t=str(key_type).lower(), l=int(key_len)))
+
+    def add(self, key_type, key_len):
+        """Declare a pool and load its stored keys
+        """
+        name = (str(key_type).lower(), int(key_len))
+        path = self._dir(*name)
+        if not os.path.isdir(path):
+            os.makedirs(path, mode=0o700)
+
+        with self._lock:
+            if name in self._pools:
+                return
+            self._pools[name] = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.pem')]
+
+    def count(self, key_type, key_len):
+        with self._lock:
+            return len(self._pools.get((str(key_type).lower(), int(key_len)), []))
+
+    def take(self, key_type, key_len):
+        """Return a key from pool, or None if pool is empty
+        """
+        name = (str(key_type).lower(), int(key_len))
+        while True:
+            with self._lock:
+                try:
+                    path = self._pools[name].pop()
+                except (KeyError, IndexError):
+                    return None
+            try:
+                with open(path, 'rb') as raw:
+                    pem = raw.read()
+                os.unlink(path)
+                return load_key(pem, self._passphrase)
+            except Exception as err:
+                # Unusable key, try next one
+                self.output('Invalid pooled key {p}: {e}'.format(p=path, e=err), level="WARNING")
+
+    def refill(self):
+        """Generate keys until all pools are full
+        Return number of keys generated
+        """
+        with self._lock:
+            missing = [(name, self.size - len(keys)) for name, keys in self._pools.items() if len(keys) < self.size]
+        if not missing:
+            return 0
+
+        generated = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._workers) as workers:
+            futures = dict({})
+            for (name, count) in missing:
+                for i in range(count):
+                    futures[workers.submit(generate_key_pem, name[0], name[1], self._passphrase)] = name
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                path = os.path.join(self._dir(*name), '{i}.pem'.format(i=uuid.uuid4().hex))
+                try:
+                    write_file(path, future.result(), mode=0o600)
+                except Exception as err:
+                    self.output('Unable to generate {t}:{l} key: {e}'.format(t=name[0], l=name[1], e=err), level="ERROR")
+                    continue
+                with self._lock:
+                    self._pools[name].append(path)
+                generated += 1
+
+        return generated
@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+
+import os
+import tempfile
+import ipaddress
+import validators
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa, ec
+
+# DN attributes names as found in '/K=V/K=V' strings
+DN_OIDS = {
+    'C': NameOID.COUNTRY_NAME,
+    'ST': NameOID.STATE_OR_PROVINCE_NAME,
+    'L': NameOID.LOCALITY_NAME,
+    'O': NameOID.ORGANIZATION_NAME,
+    'OU': NameOID.ORGANIZATIONAL_UNIT_NAME,
+    'CN': NameOID.COMMON_NAME,
+    'DC': NameOID.DOMAIN_COMPONENT,
+    'emailAddress': NameOID.EMAIL_ADDRESS,
+}
+
+# EC key length to curve
+EC_CURVES = {
+    256: ec.SECP256R1,
+    384: ec.SECP384R1,
+    521: ec.SECP521R1,
+}
+
+DIGESTS = {
+    'md5': hashes.MD5,
+    'sha1': hashes.SHA1,
+    'sha224': hashes.SHA224,
+    'sha256': hashes.SHA256,
+    'sha384': hashes.SHA384,
+    'sha512': hashes.SHA512,
+}
+
+def generate_key(key_type, key_len):
+    """Generate private key of profile 'keyType' (rsa, dsa or ec)
+    and 'keyLen' (bits, or curve size for ec)
+    """
+    key_type = str(key_type).lower()
+    key_len  = int(key_len)
+
+    if key_type == 'rsa':
+        return rsa.generate_private_key(public_exponent=65537, key_size=key_len, backend=default_backend())
+    elif key_type == 'dsa':
+        return dsa.generate_private_key(key_size=key_len, backend=default_backend())
+    elif key_type in ('ec', 'ecdsa'):
+        try:
+            return ec.generate_private_key(EC_CURVES[key_len](), default_backend())
+        except KeyError:
+            raise Exception('Unsupported EC key length: {l}'.format(l=key_len))
+
+    raise Exception('Unsupported key type: {t}'.format(t=key_type))
+
+def parse_dn(dn):
+    """Build x509 Name from '/K=V/K=V' string
+    """
+    attributes = list()
+    for part in str(dn).strip('/').split('/'):
+        try:
+            (name, value) = part.split('=', 1)
+            attributes.append(x509.NameAttribute(DN_OIDS[name.strip()], value))
+        except (KeyError, ValueError):
+            raise Exception('Invalid DN part: {p}'.format(p=part))
+
+    return x509.Name(attributes)
+
+def build_sans(sans):
+    """Typed SubjectAlternativeName entries, same rules as openssl command
+    """
+    names = list()
+    for s in sans:
+        if validators.email(s):
+            names.append(x509.RFC822Name(s))
+        elif validators.domain(s):
+            names.append(x509.DNSName(s))
+        elif validators.url(s):
+            names.append(x509.UniformResourceIdentifier(s))
+        elif validators.ipv4(s):
+            names.append(x509.IPAddress(ipaddress.ip_address(s)))
+        else:
+            names.append(x509.DNSName(s))
+
+    return names
+
+def build_csr(key, digest, dn, sans=None):
+    """Return CSR PEM (bytes) signed with 'key'
+    """
+    try:
+        algorithm = DIGESTS[str(digest).lower()]()
+    except KeyError:
+        raise Exception('Unsupported digest: {d}'.format(d=digest))
+
+    builder = x509.CertificateSigningRequestBuilder().subject_name(parse_dn(dn))
+    if sans:
+        builder = builder.add_extension(x509.SubjectAlternativeName(build_sans(sans)), critical=False)
+    csr = builder.sign(key, algorithm, default_backend())
+
+    return csr.public_bytes(serialization.Encoding.PEM)
+
+def key_pem(key, passphrase=None):
+    """Return private key PEM (bytes), encrypted if 'passphrase' is set
+    """
+    if passphrase:
+        encryption = serialization.BestAvailableEncryption(passphrase)
+    else:
+        encryption = serialization.NoEncryption()
+
+    return key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL if not passphrase else serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=encryption)
+
+def load_key(pem, passphrase=None):
+    return serialization.load_pem_private_key(pem, password=passphrase or None, backend=default_backend())
+
+def generate_key_pem(key_type, key_len, passphrase=None):
+    """Generate private key, return its PEM, can be run in another process
+    """
+    return key_pem(generate_key(key_type, key_len), passphrase)
+
+def generate_keychain(key_type, key_len, digest, dn, sans=None):
+    """Generate private key and its certificate request
+    Return (key PEM, CSR PEM) as bytes, can be run in another process
+    """
+    key = generate_key(key_type, key_len)
+
+    return (key_pem(key), build_csr(key, digest, dn, sans))
+
+def write_file(path, data, mode=0o644):
+    """Atomically write bytes with 'mode' permissions
+    File is never readable by others, even while being written
+    """
+    (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            raw.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
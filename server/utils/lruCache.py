@@ -0,0 +1,74 @@
+# -*- coding:utf-8 -*-
+
+import time
+import threading
+import collections
+
+class LRUCache(object):
+    """Thread-safe bounded cache
+    Least recently used entries are evicted once 'size' is reached.
+    Entries can also expire, using default 'ttl' (in seconds) or an
+    explicit expiration timestamp set on each entry.
+    """
+    def __init__(self, size=1024, ttl=None):
+        if int(size) < 1:
+            raise ValueError('Cache size must be positive')
+
+        self.size     = int(size)
+        self.ttl      = ttl
+        self._lock    = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                (value, expires) = self._entries[key]
+            except KeyError:
+                return default
+            if (expires is not None) and (time.time() >= expires):
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expires=None):
+        """Store value, expiring after 'ttl' seconds or at 'expires' timestamp
+        """
+        if expires is None:
+            if ttl is None:
+                ttl = self.ttl
+            if ttl is not None:
+                expires = time.time() + ttl
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                return self._entries.pop(key)[0]
+            except KeyError:
+                return default
+
+    def discard(self, match):
+        """Remove all entries whose key match function returns True
+        """
+        with self._lock:
+            keys = [k for k in self._entries if match(k)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,233 @@
+# -*- coding:utf-8 -*-
+
+import time
+import uuid
+import bisect
+import calendar
+import itertools
+import threading
+import collections
+
+class NodeStore(object):
+    """Local replica of CA nodes inventory
+    Every change (from a CA snapshot or from an RA operation) increments
+    the store revision and is kept in a bounded change log, so clients can
+    ask for changes since a revision instead of the whole inventory.
+    Revisions restart on each process, so clients get them as cursors
+    ('epoch-revision') tied to this store 'epoch'.
+    Stored node dicts are never modified in place, only replaced.
+
+    Nodes are indexed by DN and serial, and ordered CN and expiry indexes
+    allow cheap prefix and range queries. 'parse_serial' and 'parse_date' functions
+    convert node 'Serial' and 'Expire' values (errors mean no value).
+    """
+    def __init__(self, parse_serial=int, parse_date=None, changes=10000):
+        self._lock         = threading.RLock()
+        self._cond         = threading.Condition(self._lock)
+        self._nodes        = dict({})
+        self._cns          = list()
+        self._by_serial    = dict({})
+        self._expiry       = list()
+        self._keys         = dict({})
+        self._parse_serial = parse_serial
+        self._parse_date   = parse_date
+        self._changes      = collections.deque(maxlen=changes)
+        self.revision      = 0
+        self.epoch         = uuid.uuid4().hex[:12]
+        self.synced        = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _record(self, action, dn, node):
+        self.revision += 1
+        self._changes.append({'revision': self.revision, 'action': action, 'dn': dn, 'node': node})
+        self._cond.notify_all()
+
+    def _node_keys(self, node):
+        """Index keys of a node: (cn, serial, expiry timestamp)
+        """
+        try:
+            serial = self._parse_serial(node['Serial']) if node.get('Serial') is not None else None
+        except Exception:
+            serial = None
+
+        expire = None
+        if self._parse_date is not None:
+            try:
+                date = self._parse_date(node.get('Expire'))
+                if date is not None:
+                    expire = calendar.timegm(date.timetuple())
+            except Exception:
+                expire = None
+
+        cn = node.get('CN')
+
+        return (None if cn is None else str(cn), serial, expire)
+
+    def _same(self, dn, current, node):
+        """Compare nodes with parsed 'Serial' and 'Expire' values, as
+        values set by RA operations may not be written the CA way
+        """
+        others = lambda n: {k: v for k, v in n.items() if k not in ('Serial', 'Expire')}
+        if others(current) != others(node):
+            return False
+
+        return self._keys[dn] == self._node_keys(node)
+
+    def _put(self, dn, node):
+        self._remove(dn)
+
+        (cn, serial, expire) = self._node_keys(node)
+        self._nodes[dn] = node
+        self._keys[dn] = (cn, serial, expire)
+        if cn is not None:
+            bisect.insort(self._cns, (cn, dn))
+        if serial is not None:
+            self._by_serial[serial] = dn
+        if expire is not None:
+            bisect.insort(self._expiry, (expire, dn))
+
+    def _remove(self, dn):
+        try:
+            del self._nodes[dn]
+            (cn, serial, expire) = self._keys.pop(dn)
+        except KeyError:
+            return
+
+        if cn is not None:
+            i = bisect.bisect_left(self._cns, (cn, dn))
+            if (i < len(self._cns)) and (self._cns[i] == (cn, dn)):
+                del self._cns[i]
+        if (serial is not None) and (self._by_serial.get(serial) == dn):
+            del self._by_serial[serial]
+        if expire is not None:
+            i = bisect.bisect_left(self._expiry, (expire, dn))
+            if (i < len(self._expiry)) and (self._expiry[i] == (expire, dn)):
+                del self._expiry[i]
+
+    def load(self, nodes):
+        """Apply a full CA snapshot, only differences are recorded
+        Return number of changes
+        """
+        snapshot = dict({})
+        for node in nodes:
+            try:
+                snapshot[node['DN']] = node
+            except (KeyError, TypeError):
+                continue
+
+        with self._lock:
+            start = self.revision
+            for dn in list(self._nodes.keys()):
+                if dn not in snapshot:
+                    self._remove(dn)
+                    self._record('delete', dn, None)
+            for dn, node in snapshot.items():
+                current = self._nodes.get(dn)
+                if current == node:
+                    continue
+                same = (current is not None) and self._same(dn, current, node)
+                self._put(dn, node)
+                if same:
+                    # Only representation differs, keep CA one silently
+                    continue
+                self._record('add' if current is None else 'update', dn, node)
+            self.synced = time.time()
+
+            return self.revision - start
+
+    def apply(self, action, dn, values=None):
+        """Apply an RA operation on a node
+        'values' are merged into current node, action 'delete' removes it
+        Operation is always recorded, even if node is unchanged
+        Return updated node (or None)
+        """
+        with self._lock:
+            current = self._nodes.get(dn)
+            if action == 'delete':
+                self._remove(dn)
+                self._record(action, dn, None)
+                return None
+
+            node = dict(current or {'DN': dn})
+            node.update(values or {})
+            if node != current:
+                self._put(dn, node)
+            self._record(action, dn, node)
+
+            return node
+
+    def get(self, dn):
+        return self._nodes.get(dn)
+
+    def by_cn(self, cn, prefix=False):
+        """Nodes with 'cn' as CN (or CN starting with it if 'prefix' is set)
+        ordered by CN
+        """
+        cn = str(cn)
+        with self._lock:
+            nodes = list()
+            for i in range(bisect.bisect_left(self._cns, (cn, '')), len(self._cns)):
+                (name, dn) = self._cns[i]
+                if (name != cn) and not (prefix and name.startswith(cn)):
+                    break
+                nodes.append(self._nodes[dn])
+            return nodes
+
+    def by_serial(self, serial):
+        with self._lock:
+            dn = self._by_serial.get(serial)
+            return None if dn is None else self._nodes.get(dn)
+
+    def expiring(self, after=None, before=None):
+        """Nodes expiring between 'after' and 'before' timestamps (included)
+        ordered by expiration date
+        """
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_left(self._expiry, (after, ''))
+            end = len(self._expiry) if before is None else bisect.bisect_right(self._expiry, (before, '\U0010ffff'))
+            return [self._nodes[dn] for (expire, dn) in self._expiry[start:end]]
+
+    def all(self):
+        with self._lock:
+            return list(self._nodes.values())
+
+    def cursor(self, revision=None):
+        """Client cursor of 'revision' (current one if None)
+        """
+        return '{e}-{r}'.format(e=self.epoch, r=self.revision if revision is None else revision)
+
+    def revision_of(self, cursor):
+        """Revision of a client cursor
+        None if cursor is invalid or comes from another process
+        """
+        (epoch, sep, revision) = str(cursor).rpartition('-')
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(revision)
+        except ValueError:
+            return None
+
+    def wait(self, since, timeout=None):
+        """Wait until revision moves from 'since'
+        Return False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.revision != since, timeout)
+
+    def changes(self, since):
+        """Return changes after 'since' revision
+        or None if change log does not go back that far
+        """
+        with self._lock:
+            if (since < 0) or (since > self.revision):
+                return None
+            if since == self.revision:
+                return list()
+            first = self._changes[0]['revision'] if len(self._changes) else self.revision + 1
+            if first > since + 1:
+                return None
+            # Revisions are contiguous in log
+            return list(itertools.islice(self._changes, since + 1 - first, None))
@@ -0,0 +1,115 @@
+# -*- coding:utf-8 -*-
+
+import os
+import time
+import tempfile
+import threading
+
+class OCSPStore(object):
+    """On-disk store of pre-generated OCSP answers
+    Each serial (hexadecimal) has its DER request ('.req') and DER answer
+    ('.der') in store directory. An in-memory index keeps answers validity
+    and update time so no file has to be read to plan regenerations.
+    """
+    def __init__(self, path):
+        self.path   = path
+        self._lock  = threading.Lock()
+        self._index = dict({})
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def _file(self, serial, ext):
+        return os.path.join(self.path, '{s:X}.{e}'.format(s=serial, e=ext))
+
+    def _write(self, path, data):
+        (fd, tmp_path) = tempfile.mkstemp(dir=self.path, prefix='.tmp.')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                raw.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, infos):
+        """Rebuild index from store directory
+        'infos' function return answer validity from DER content
+        """
+        index = dict({})
+        for name in os.listdir(self.path):
+            if not name.endswith('.der'):
+                continue
+            try:
+                serial = int(name[:-4], 16)
+                path = os.path.join(self.path, name)
+                with open(path, 'rb') as raw:
+                    details = infos(raw.read())
+                index[serial] = {'next_update': details['next_update'], 'this_update': details['this_update'], 'mtime': os.path.getmtime(path)}
+            except Exception:
+                continue
+
+        with self._lock:
+            self._index = index
+
+        return len(index)
+
+    def serials(self):
+        with self._lock:
+            return set(self._index.keys())
+
+    def meta(self, serial):
+        with self._lock:
+            return self._index.get(serial)
+
+    def request(self, serial):
+        """Return stored DER request or None
+        """
+        try:
+            with open(self._file(serial, 'req'), 'rb') as raw:
+                return raw.read()
+        except (IOError, OSError):
+            return None
+
+    def get(self, serial):
+        """Return stored DER answer or None
+        """
+        try:
+            with open(self._file(serial, 'der'), 'rb') as raw:
+                return raw.read()
+        except (IOError, OSError):
+            return None
+
+    def put(self, serial, request_der, response_der, this_update, next_update):
+        if self.request(serial) != request_der:
+            self._write(self._file(serial, 'req'), request_der)
+        self._write(self._file(serial, 'der'), response_der)
+
+        with self._lock:
+            self._index[serial] = {'next_update': next_update, 'this_update': this_update, 'mtime': time.time()}
+
+    def remove(self, serial):
+        with self._lock:
+            self._index.pop(serial, None)
+
+        for ext in ('req', 'der'):
+            try:
+                os.unlink(self._file(serial, ext))
+            except OSError:
+                pass
+
+    def items(self, since=None, serials=None):
+        """Yield (serial, DER answer) updated after 'since' timestamp
+        """
+        with self._lock:
+            index = dict(self._index)
+
+        for serial, meta in index.items():
+            if (since is not None) and (meta['mtime'] <= since):
+                continue
+            if (serials is not None) and (serial not in serials):
+                continue
+            der = self.get(serial)
+            if der is not None:
+                yield (serial, der)
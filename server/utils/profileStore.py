@@ -0,0 +1,97 @@
+# -*- coding:utf-8 -*-
+
+import json
+import time
+import hashlib
+import threading
+
+class ProfileStore(object):
+    """Local copy of CA profiles
+    Profiles mapping is never modified in place but replaced on each
+    change, so readers always see a consistent set without locking.
+    'version' is incremented on each change and 'digest' identifies the
+    content last loaded from CA, so an unchanged CA answer is a no-op.
+    """
+    def __init__(self, ttl=300):
+        self.ttl       = ttl
+        self._lock     = threading.Lock()
+        self._profiles = dict({})
+        self.version   = 0
+        self.digest    = None
+        self.loaded    = None
+
+    def __contains__(self, name):
+        return name in self._profiles
+
+    def __getitem__(self, name):
+        return self._profiles[name]
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, name, default=None):
+        return self._profiles.get(name, default)
+
+    def keys(self):
+        return list(self._profiles.keys())
+
+    def values(self):
+        return list(self._profiles.values())
+
+    def all(self):
+        """Return copies of all profiles
+        """
+        return [dict(p) for p in self._profiles.values()]
+
+    def fresh(self):
+        return (self.loaded is not None) and (time.time() - self.loaded < self.ttl)
+
+    def touch(self):
+        """Consider current profiles fresh for another 'ttl' seconds
+        """
+        self.loaded = time.time()
+
+    def load(self, profiles):
+        """Replace all profiles with CA answer (dict by name)
+        Return the set of names added, changed or removed
+        """
+        digest = hashlib.sha256(json.dumps(profiles, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            self.loaded = time.time()
+            if digest == self.digest:
+                return set()
+
+            current = self._profiles
+            profiles = {name: dict(profile, name=name) for name, profile in profiles.items()}
+            changed = set(n for n in set(current) | set(profiles) if current.get(n) != profiles.get(n))
+            self._profiles = profiles
+            self.digest = digest
+            if changed:
+                self.version += 1
+
+        return changed
+
+    def put(self, name, profile, replace=None):
+        """Add or update a profile, replacing 'replace' name if set
+        """
+        with self._lock:
+            profiles = dict(self._profiles)
+            if replace is not None:
+                profiles.pop(replace, None)
+            profiles[name] = dict(profile, name=name)
+            self._profiles = profiles
+            self.version += 1
+            # Next CA answer must be applied
+            self.digest = None
+
+    def remove(self, name):
+        with self._lock:
+            if name not in self._profiles:
+                return False
+            profiles = dict(self._profiles)
+            del profiles[name]
+            self._profiles = profiles
+            self.version += 1
+            self.digest = None
+
+        return True
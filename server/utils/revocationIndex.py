@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+
+import datetime
+import threading
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+
+class RevocationIndex(object):
+    """In-memory index of revoked serials built from CRL
+    Give instant revocation status without asking CA.
+    """
+    def __init__(self):
+        self._lock        = threading.Lock()
+        self._revoked     = dict({})
+        self._fingerprint = None
+        self.last_update  = None
+        self.next_update  = None
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def update(self, crl_pem):
+        """Apply CRL content to index
+        Only changed entries are touched, return the set of serials
+        whose status changed (newly revoked or removed from CRL).
+        """
+        try:
+            crl = x509.load_pem_x509_crl(crl_pem.encode('utf-8'), default_backend())
+        except Exception as err:
+            raise Exception('Unable to parse CRL: {e}'.format(e=err))
+
+        fingerprint = crl.fingerprint(crl.signature_hash_algorithm)
+        if fingerprint == self._fingerprint:
+            return set()
+
+        serials = set()
+        entries = dict({})
+        for revoked in crl:
+            serials.add(revoked.serial_number)
+            entries[revoked.serial_number] = revoked
+
+        with self._lock:
+            removed = set(self._revoked.keys()) - serials
+            added   = serials - set(self._revoked.keys())
+            for serial in removed:
+                del self._revoked[serial]
+            for serial in added:
+                self._revoked[serial] = self._entry(entries[serial])
+            self._fingerprint = fingerprint
+            self.last_update  = crl.last_update
+            self.next_update  = crl.next_update
+
+        return added | removed
+
+    def _entry(self, revoked):
+        try:
+            reason = revoked.extensions.get_extension_for_class(x509.CRLReason).value.reason.name
+        except x509.ExtensionNotFound:
+            reason = 'unspecified'
+
+        return {'reason': reason, 'date': revoked.revocation_date}
+
+    def fresh(self):
+        """CRL used is still valid
+        """
+        if self._fingerprint is None:
+            return False
+        if self.next_update is None:
+            return True
+        return datetime.datetime.utcnow() < self.next_update
+
+    def lookup(self, serial):
+        """Return revocation infos (reason, date) or None if not revoked
+        """
+        return self._revoked.get(serial)
@@ -0,0 +1,105 @@
+# -*- coding:utf-8 -*-
+
+import time
+import threading
+
+from .common import Common
+
+class Scheduler(Common):
+    """Run periodic tasks in background
+    Each run happens in its own thread so a slow task never delays others.
+    Task function may return the delay (in seconds) before its next run,
+    otherwise its default interval is used. On error the task is run again
+    after 'retry' seconds.
+    """
+    def __init__(self, logger, retry=60):
+        try:
+            super(Scheduler, self).__init__(logger)
+        except Exception as err:
+            raise Exception(err)
+
+        self._retry   = retry
+        self._tasks   = dict({})
+        self._cond    = threading.Condition()
+        self._thread  = None
+        self._stopped = False
+
+    def add(self, name, func, interval, delay=0):
+        """Register a task, first run after 'delay' seconds
+        """
+        with self._cond:
+            self._tasks[name] = {
+                'func': func,
+                'interval': interval,
+                'next': time.time() + delay,
+                'running': False,
+                'again': False,
+            }
+            self._cond.notify()
+
+    def trigger(self, name):
+        """Run task as soon as possible
+        If task is currently running, it will be run again once done
+        """
+        with self._cond:
+            try:
+                task = self._tasks[name]
+            except KeyError:
+                return False
+            if task['running']:
+                task['again'] = True
+            else:
+                task['next'] = time.time()
+            self._cond.notify()
+
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name='scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                wait = None
+                for name, task in self._tasks.items():
+                    if task['running']:
+                        continue
+                    if task['next'] <= now:
+                        task['running'] = True
+                        worker = threading.Thread(target=self._run, args=(name, task), name='task-{n}'.format(n=name))
+                        worker.daemon = True
+                        worker.start()
+                    elif (wait is None) or (task['next'] - now < wait):
+                        wait = task['next'] - now
+                self._cond.wait(wait)
+
+    def _run(self, name, task):
+        try:
+            delay = task['func']()
+            if delay is None:
+                delay = task['interval']
+        except Exception as err:
+            self.output('Background task {n} failed: {e}'.format(n=name, e=err), level="ERROR")
+            delay = min(self._retry, task['interval'])
+
+        with self._cond:
+            task['running'] = False
+            if task['again']:
+                task['again'] = False
+                delay = 0
+            task['next'] = time.time() + delay
+            self._cond.notify()
@@ -1,25 +1,114 @@
 # -*- coding: utf-8 -*-
 
+import time
+import threading
+
 from flask import request
 from flask import Response
 
+from .lruCache import LRUCache
+
 class TLSAuth(object):
     """Global class for TLS client access management
     works with flask request headers
     Ideas from https://github.com/stef/flask-tlsauth
     """
-    def __init__(self, groups=[], verify='SSL-Client-Verify', dn='SSL-Client-DN'):
+    def __init__(self, groups=None, verify='SSL-Client-Verify', dn='SSL-Client-DN', loader=None, ttl=300, cache_size=4096):
         """Build the global class parameters
         Set verify header fill by nginx/apache using 'verify' parameter
         Set dn header fill by nginx/apache using 'dn' parameter
+        Set 'loader' function returning allowed DN list to refresh groups
+        every 'ttl' seconds (in background once first loaded)
         """
-        if not isinstance(groups, list):
+        if groups is None:
+            groups = list()
+        if not isinstance(groups, (list, set, frozenset, tuple)):
             raise ValueError('Groups must be list object')
 
         # Set class variables
         self.__header_verify = verify
         self.__header_dn = dn
-        self.groups = groups
+        self.loader = loader
+        self.ttl = ttl
+        # Members set is replaced on each change, never modified in place
+        self._groups = frozenset(groups)
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._changes = 0
+        self._refreshing = False
+        self._dns = LRUCache(cache_size)
+
+    @property
+    def groups(self):
+        return self._groups
+
+    def set_groups(self, groups):
+        with self._lock:
+            self._groups = frozenset(groups)
+            self._loaded = time.time()
+
+    def add(self, dn):
+        with self._lock:
+            self._groups = self._groups | {dn}
+            self._changes += 1
+
+    def discard(self, dn):
+        with self._lock:
+            self._groups = self._groups - {dn}
+            self._changes += 1
+
+    def refresh(self):
+        """Reload groups if never loaded (blocking) or expired (background)
+        """
+        if self.loader is None:
+            return
+        if self._loaded is None:
+            self.set_groups(self.loader())
+            return
+        if time.time() - self._loaded < self.ttl:
+            return
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        worker = threading.Thread(target=self._reload, name='tlsauth-refresh')
+        worker.daemon = True
+        worker.start()
+
+    def _reload(self):
+        changes = self._changes
+        try:
+            groups = frozenset(self.loader())
+            with self._lock:
+                # Local changes made meanwhile may be missing from answer
+                if changes == self._changes:
+                    self._groups = groups
+                    self._loaded = time.time()
+        except Exception:
+            # Keep current groups, try again after ttl
+            with self._lock:
+                self._loaded = time.time()
+        finally:
+            self._refreshing = False
+
+    def normalize(self, dn):
+        """Return DN in '/K=V/K=V' form
+        Add support for nginx version newer than 1.11.6
+        Compliance with RFC 2253 (RFC 4514) format
+        """
+        if not dn or dn.startswith('/'):
+            return dn
+
+        normalized = self._dns.get(dn)
+        if normalized is None:
+            infos = dn.split(',')
+            infos.reverse()
+            normalized = '/{i}'.format(i='/'.join(infos))
+            self._dns.set(dn, normalized)
+
+        return normalized
 
     def __unauth(self):
         return Response('Forbidden', 403)
@@ -31,24 +120,18 @@ class TLSAuth(object):
         """
         if not unauth:
             unauth = self.__unauth
-        if not groups:
-            groups = self.groups
+        if groups:
+            groups = frozenset(groups)
 
         def decor(func):
             def tls_wrapper(*args, **kwargs):
                 verified = request.headers.get(self.__header_verify, False)
-                dn = request.headers.get(self.__header_dn, None)
-                # Add support for nginx version newer than 1.11.6
-                # Compliance with RFC 2253 (RFC 4514) format
-                if dn and not dn.startswith('/'):
-                    infos = dn.split(',')
-                    infos.reverse()
-                    dn = '/{i}'.format(i='/'.join(infos))
+                dn = self.normalize(request.headers.get(self.__header_dn, None))
                 # If client is verified and dn in authorized groups
-                if verified and dn and (dn in groups):
+                if verified and dn and (dn in (groups or self._groups)):
                     return func(*args, **kwargs)
                 return unauth(*args, **kwargs)
-            
+
             return tls_wrapper
 
         return decor
@@ -58,7 +141,7 @@ class TLSAuth(object):
         """
         if not unauth:
             unauth = self.__unauth
-        
+
         def decor(func):
             def tls_wrapper(*args, **kwargs):
                 verified = request.headers.get(self.__header_verify, False)
@@ -66,7 +149,7 @@ class TLSAuth(object):
                 if verified:
                     return func(*args, **kwargs)
                 return unauth(*args, **kwargs)
-            
+
             return tls_wrapper
 
         return decor
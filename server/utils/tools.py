@@ -2,9 +2,17 @@
 
 import re
 import sys
+import json
 import types
+import base64
+import datetime
 import validators
 
+from cryptography import x509
+from cryptography.x509 import ocsp
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+
 from .common import Common
 
 # if sys.version_info[0] == 3:
@@ -225,6 +233,125 @@ class Tools(Common):
         
         return dn
 
+    def _crl_next_update(self, crl_pem):
+        """Return CRL nextUpdate date (UTC) or None if not set
+        """
+        try:
+            crl = x509.load_pem_x509_crl(crl_pem.encode('utf-8'), default_backend())
+        except Exception as err:
+            raise Exception('Unable to parse CRL: {e}'.format(e=err))
+
+        return crl.next_update
+
+    def _cert_infos(self, cert_pem):
+        """Return certificate serial and validity end date (UTC)
+        """
+        try:
+            cert = x509.load_pem_x509_certificate(cert_pem.encode('utf-8'), default_backend())
+        except Exception as err:
+            raise Exception('Unable to parse certificate: {e}'.format(e=err))
+
+        return {'serial': cert.serial_number, 'not_after': cert.not_valid_after}
+
+    def _parse_date(self, value):
+        """Return naive UTC datetime from timestamp or date string
+        or None if value can not be read
+        """
+        if value is None:
+            return None
+        if isinstance(value, datetime.datetime):
+            return value
+        if isinstance(value, (int, float)):
+            return datetime.datetime.utcfromtimestamp(value)
+
+        value = str(value).strip()
+        for fmt in ('%Y%m%d%H%M%SZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                return datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+
+        return None
+
+    def _encode_cursor(self, key):
+        return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('utf-8')
+
+    def _decode_cursor(self, cursor):
+        try:
+            return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8')))
+        except Exception:
+            raise Exception('Invalid cursor')
+
+    def _parse_serial(self, serial):
+        """Return serial number as int
+        String values are read as hexadecimal (with optional ':' separators)
+        """
+        if isinstance(serial, int):
+            return serial
+
+        try:
+            value = str(serial).strip().replace(':', '').lower()
+            if value.startswith('0x'):
+                value = value[2:]
+            return int(value, 16)
+        except ValueError:
+            raise Exception('Invalid serial number')
+
+    def _ocsp_request(self, cert_pem, issuer_pem):
+        """Build DER encoded OCSP request for a certificate
+        """
+        try:
+            cert = x509.load_pem_x509_certificate(cert_pem.encode('utf-8'), default_backend())
+            issuer = x509.load_pem_x509_certificate(issuer_pem.encode('utf-8'), default_backend())
+            builder = ocsp.OCSPRequestBuilder().add_certificate(cert, issuer, hashes.SHA1())
+        except Exception as err:
+            raise Exception('Unable to build OCSP request: {e}'.format(e=err))
+
+        return builder.build().public_bytes(serialization.Encoding.DER)
+
+    def _ocsp_cert_id(self, request_der):
+        """Return CertID of an OCSP request as tuple
+        (hash algorithm, issuer name hash, issuer key hash, serial)
+        """
+        try:
+            req = ocsp.load_der_ocsp_request(request_der)
+        except Exception as err:
+            raise Exception('Invalid OCSP request: {e}'.format(e=err))
+
+        return (req.hash_algorithm.name, req.issuer_name_hash, req.issuer_key_hash, req.serial_number)
+
+    def _ocsp_nonce(self, request_der):
+        """Return nonce of an OCSP request, or None
+        """
+        try:
+            req = ocsp.load_der_ocsp_request(request_der)
+        except Exception as err:
+            raise Exception('Invalid OCSP request: {e}'.format(e=err))
+
+        try:
+            return req.extensions.get_extension_for_class(x509.OCSPNonce).value.nonce
+        except x509.ExtensionNotFound:
+            return None
+
+    def _ocsp_response_infos(self, response_der):
+        """Return OCSP response status and validity dates (UTC)
+        """
+        try:
+            resp = ocsp.load_der_ocsp_response(response_der)
+        except Exception as err:
+            raise Exception('Invalid OCSP response: {e}'.format(e=err))
+
+        if resp.response_status != ocsp.OCSPResponseStatus.SUCCESSFUL:
+            return {'successful': False}
+
+        return {
+            'successful': True,
+            'serial': resp.serial_number,
+            'status': resp.certificate_status.name.lower(),
+            'this_update': resp.this_update,
+            'next_update': resp.next_update,
+        }
+
     def _get_cn(self, dn):
         """Retrieve the CN value from complete DN
         perform validity check on CN found